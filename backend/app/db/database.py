@@ -1,24 +1,91 @@
-import os
-from sqlmodel import SQLModel, create_engine, Session
-
-# Check if running in production (Render/Neon)
-database_url = os.getenv("DATABASE_URL")
-
-if database_url:
-    # Postgres (Fix Render URL format)
-    if database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql://", 1)
-    engine = create_engine(database_url)
-else:
-    # SQLite (Local)
-    sqlite_file_name = "devis.db"
-    sqlite_url = f"sqlite:///{sqlite_file_name}"
-    connect_args = {"check_same_thread": False}
-    engine = create_engine(sqlite_url, connect_args=connect_args)
-
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
-
-def get_session():
-    with Session(engine) as session:
-        yield session
+import logging
+import os
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Connection pool (Postgres): requests only hold a connection while they talk to the
+# DB, not while they wait on the LLM (see chat_service.run_turn)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Check if running in production (Render/Neon)
+database_url = os.getenv("DATABASE_URL")
+
+if database_url:
+    url = make_url(database_url)
+    connect_args = {}
+    if url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        # Postgres (Fix Render URL format) -> async driver
+        url = url.set(drivername="postgresql+asyncpg")
+    elif url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+
+    if url.drivername == "postgresql+asyncpg":
+        # asyncpg doesn't understand libpq options (Neon URLs carry ?sslmode=require&channel_binding=...)
+        query = dict(url.query)
+        sslmode = query.pop("sslmode", None)
+        query.pop("channel_binding", None)
+        url = url.set(query=query)
+        if sslmode and sslmode != "disable":
+            connect_args["ssl"] = "require"
+    pool_args = {}
+    if url.drivername == "postgresql+asyncpg":
+        pool_args = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    engine = create_async_engine(url, connect_args=connect_args, pool_pre_ping=True, **pool_args)
+else:
+    # SQLite (Local)
+    sqlite_file_name = "devis.db"
+    sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+    engine = create_async_engine(sqlite_url)
+
+# expire_on_commit=False: objects stay usable after commit without an implicit
+# (and forbidden in async) lazy reload.
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+def _create_missing_indexes(conn):
+    # create_all() only creates indexes along with new tables:
+    # add the ones declared later on existing tables.
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with conn.begin_nested():
+                    index.create(conn, checkfirst=True)
+            except Exception as e:
+                # e.g. duplicated Entreprise.nom in old data: keep serving, fix the data
+                logger.warning("Index %s not created: %s", index.name, e)
+
+def _add_missing_columns(conn):
+    # create_all() doesn't alter existing tables either: add the columns declared
+    # later (nullable or with a scalar default, e.g. `cached_tokens: int = 0`).
+    inspector = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(conn.dialect)}'
+            if column.default is not None and column.default.is_scalar:
+                ddl += f" NOT NULL DEFAULT {column.default.arg!r}"
+            try:
+                with conn.begin_nested():
+                    conn.execute(text(ddl))
+            except Exception as e:
+                logger.warning("Column %s.%s not added: %s", table.name, column.name, e)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
+
+async def get_session():
+    async with async_session() as session:
+        yield session
@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+from typing import List, Optional, Union
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .database import engine as default_engine
+
+
+class QueryCounter:
+    """Collects the SQL statements executed on an engine while active."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine: Optional[Union[Engine, AsyncEngine]] = None):
+    """
+    Usage:
+        with count_queries() as counter:
+            ...
+        print(counter.count)
+    """
+    target = engine or default_engine
+    # Events are registered on the sync engine behind an AsyncEngine
+    target = getattr(target, "sync_engine", target)
+    counter = QueryCounter()
+    event.listen(target, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(target, "before_cursor_execute", counter)
+
+
+@contextmanager
+def assert_max_queries(budget: int, engine: Optional[Union[Engine, AsyncEngine]] = None):
+    """
+    Fails (AssertionError) if the wrapped block runs more than `budget` queries.
+    The statements are listed in the error message to spot the N+1 quickly.
+    """
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > budget:
+        details = "\n".join(f"  {i + 1}. {s}" for i, s in enumerate(counter.statements))
+        raise AssertionError(f"{counter.count} queries executed, budget is {budget}:\n{details}")
@@ -0,0 +1,41 @@
+from typing import Optional, Tuple
+from sqlalchemy.orm import contains_eager, selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.client import Client
+from ..models.devis import Devis
+from ..models.entreprise import Entreprise
+from ..services.entreprise_cache import get_entreprise_by_nom
+
+# Loader options shared by every "full" devis read.
+# - client is joined in the main SELECT (many-to-one, at most one row)
+# - lignes are fetched with a single IN (...) query (one-to-many, avoids row explosion)
+# => 2 queries in total, whatever the number of lines. The entreprise comes from
+# the tenant cache (no query when warm).
+# Eager loading is mandatory with AsyncSession: lazy loads raise instead of querying.
+def _full_devis_statement():
+    return (
+        select(Devis)
+        .outerjoin(Client, Client.id == Devis.client_id)
+        .options(contains_eager(Devis.client), selectinload(Devis.lignes))
+    )
+
+
+async def get_devis_with_entreprise(session: AsyncSession, devis_id: str) -> Tuple[Optional[Devis], Optional[Entreprise]]:
+    """
+    Charge un devis avec ses lignes, son client et son entreprise (cache) en 2 requêtes.
+    Retourne (None, None) si le devis n'existe pas.
+    """
+    devis = await get_devis_full(session, devis_id)
+    if not devis:
+        return None, None
+    # Old quotes have no entreprise_nom: fall back on the client's one
+    nom = devis.entreprise_nom or (devis.client.entreprise_nom if devis.client else None)
+    return devis, await get_entreprise_by_nom(session, nom)
+
+
+async def get_devis_full(session: AsyncSession, devis_id: str) -> Optional[Devis]:
+    """Charge un devis avec ses lignes et son client (sans l'entreprise)."""
+    statement = _full_devis_statement().where(Devis.id == devis_id).execution_options(populate_existing=True)
+    return (await session.exec(statement)).first()
@@ -1,67 +1,125 @@
-from dotenv import load_dotenv
-load_dotenv()
-
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from .db.database import create_db_and_tables
-from fastapi.staticfiles import StaticFiles
-from .routers import chat, devis, entreprise, clients, upload, feedback, pricelist
-
-# Initialization of the app
-app = FastAPI(title="IA Devis API (Refactored)") # Reload trigger
-
-# CORS Configuration
-# CORS Configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=False,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-
-# Global Exception Handler (For Debugging Prod)
-from fastapi import Request
-from fastapi.responses import JSONResponse
-@app.exception_handler(Exception)
-async def debug_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
-        status_code=500,
-        content={"detail": f"Internal Server Error: {str(exc)}", "type": type(exc).__name__},
-    )
-
-@app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
-
-# EMERGENCY DB RESET (For Schema Updates)
-@app.post("/admin/reset-db")
-def reset_database(key: str):
-    if key != "secure_reset_2024":
-        return {"error": "Invalid key"}
-    
-    from sqlmodel import SQLModel
-    from .db.database import engine
-    
-    # Drop all
-    SQLModel.metadata.drop_all(engine)
-    # Recreate all
-    SQLModel.metadata.create_all(engine)
-    
-    return {"status": "Database Reset and Updated"}
-
-@app.get("/health")
-def health_check():
-    return {"status": "ok", "version": "2.0.0"}
-
-# Include Routers
-app.include_router(chat.router)
-app.include_router(devis.router)
-app.include_router(entreprise.router)
-app.include_router(clients.router)
-app.include_router(upload.router)
-app.include_router(feedback.router)
-app.include_router(pricelist.router)
+from dotenv import load_dotenv
+load_dotenv()
+
+from .services.logging_config import RequestIdMiddleware, setup_logging
+setup_logging()
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from .db.database import create_db_and_tables, engine
+from fastapi.staticfiles import StaticFiles
+from .routers import chat, devis, entreprise, clients, upload, feedback, pricelist, emails, usage, profiles
+from .services.email_outbox import start_outbox_worker, stop_outbox_worker
+from .services.timing import TimingMiddleware, instrument_engine
+from .services.metrics import MetricsMiddleware, instrument_pool, render_metrics
+from .services.profiler import ProfilerMiddleware
+from .services.idempotency import IdempotencyMiddleware
+from .services.admission import AdmissionRejected
+from .services import live_sessions
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Initialization of the app
+app = FastAPI(title="IA Devis API (Refactored)") # Reload trigger
+
+# Innermost: replays the stored app response (CORS, timing... headers are added per request)
+app.add_middleware(IdempotencyMiddleware)
+
+# CORS Configuration
+# CORS Configuration
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=False,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing", "Idempotent-Replayed", "Retry-After"],
+)
+
+# Large JSON payloads (quotes with hundreds of lines) compress ~30x
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Server-Timing header on every response (db, llm, pdf, email... spans)
+app.add_middleware(TimingMiddleware)
+instrument_engine(engine)
+
+# Prometheus metrics (scraped on /metrics)
+app.add_middleware(MetricsMiddleware)
+instrument_pool(engine)
+
+# On-demand profiling of a single request (X-Profile: 1 + X-Admin-Key)
+app.add_middleware(ProfilerMiddleware)
+
+# Outermost: the request id is set for every log line of the request
+app.add_middleware(RequestIdMiddleware)
+
+# Mount static files
+app.mount("/static", StaticFiles(directory="app/static"), name="static")
+
+# Global Exception Handler (For Debugging Prod)
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(status_code=429, content={"detail": exc.detail}, headers={"Retry-After": str(exc.retry_after)})
+
+@app.exception_handler(Exception)
+async def debug_exception_handler(request: Request, exc: Exception):
+    logger.exception("Unhandled error on %s %s", request.method, request.url.path)
+    return JSONResponse(
+        status_code=500,
+        content={"detail": f"Internal Server Error: {str(exc)}", "type": type(exc).__name__},
+    )
+
+@app.on_event("startup")
+async def on_startup():
+    await create_db_and_tables()
+    # EMAIL_OUTBOX_WORKER=0 when emails are delivered by another process
+    if os.getenv("EMAIL_OUTBOX_WORKER", "1") != "0":
+        start_outbox_worker()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_outbox_worker()
+    # Write-behind of the WebSocket chat sessions
+    await live_sessions.flush_all()
+
+# EMERGENCY DB RESET (For Schema Updates)
+@app.post("/admin/reset-db")
+async def reset_database(key: str):
+    if key != "secure_reset_2024":
+        return {"error": "Invalid key"}
+    
+    from sqlmodel import SQLModel
+    
+    async with engine.begin() as conn:
+        # Drop all
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        # Recreate all
+        await conn.run_sync(SQLModel.metadata.create_all)
+    
+    return {"status": "Database Reset and Updated"}
+
+@app.get("/health")
+def health_check():
+    return {"status": "ok", "version": "2.0.0"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+# Include Routers
+app.include_router(chat.router)
+app.include_router(devis.router)
+app.include_router(entreprise.router)
+app.include_router(clients.router)
+app.include_router(upload.router)
+app.include_router(feedback.router)
+app.include_router(pricelist.router)
+app.include_router(emails.router)
+app.include_router(usage.router)
+app.include_router(profiles.router)
@@ -0,0 +1,48 @@
+from typing import Dict, List, Optional
+from sqlmodel import SQLModel
+from datetime import date as dt_date
+from .client import ClientBase
+from .devis import DevisBase, LigneBase
+
+# Response shapes of /chat/start and /chat/turn (kept compatible with the old frontend).
+# They document the API and define the field layout of the fast serializer
+# (services/devis_serializer.py): responses are not re-validated by FastAPI.
+
+class LignePublic(LigneBase):
+    id: Optional[int] = None
+    devis_id: Optional[str] = None
+
+class ClientPublic(ClientBase):
+    id: Optional[str] = None
+
+class Totaux(SQLModel):
+    ht: float
+    tva: float
+    ttc: float
+    tva_by_rate: Dict[str, float]
+    acompte_ttc: float
+    reste_a_payer_ttc: float
+
+class DevisMeta(SQLModel):
+    devis_id: str
+    date: dt_date
+    statut: str
+    theme: str
+    accent_hex: str
+    objet: Optional[str] = None
+
+class DevisPayload(DevisBase):
+    id: str
+    number: int
+    client_id: Optional[str] = None
+    lignes: List[LignePublic]
+    totaux: Totaux
+    meta: DevisMeta
+    client: Optional[ClientPublic] = None
+
+class ChatResponse(SQLModel):
+    session_id: str
+    assistant_message: str
+    chips: List[str]
+    devis_id: str
+    devis: DevisPayload
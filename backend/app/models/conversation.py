@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+class ConversationMessage(SQLModel, table=True):
+    # Dialogue log of a devis (text only, capped: the quote lines live in Ligne)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    devis_id: str = Field(foreign_key="devis.id", index=True)
+    role: str # user, assistant
+    content: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ConversationSummary(SQLModel, table=True):
+    # Rolling summary of the messages older than the history window, updated in the background
+    devis_id: str = Field(foreign_key="devis.id", primary_key=True)
+    summary: str = ""
+    summarized_until: int = 0 # Id of the last ConversationMessage folded into the summary
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
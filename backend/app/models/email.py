@@ -0,0 +1,43 @@
+from typing import Optional
+from datetime import datetime, timezone
+from sqlmodel import SQLModel, Field
+import uuid
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class EmailAttachment(SQLModel, table=True):
+    # Stored once, possibly shared by several outbox emails (same PDF, many recipients)
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, primary_key=True)
+    filename: str
+    content_type: str = "application/octet-stream"
+    data: bytes
+
+class EmailOutbox(SQLModel, table=True):
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, primary_key=True)
+    to_email: str
+    recipient_type: str = "to" # to, cc, bcc (each recipient gets its own copy)
+    subject: str
+    html: str
+    reply_to: Optional[str] = None
+    attachment_id: Optional[str] = Field(default=None, foreign_key="emailattachment.id")
+
+    # Delivery state: pending -> sending -> sent | pending (retry) | dead (dead letter)
+    status: str = Field(default="pending", index=True)
+    attempts: int = 0
+    # Next delivery attempt; while "sending", acts as the lease expiry of the worker
+    next_attempt_at: datetime = Field(default_factory=utcnow, index=True)
+    last_error: Optional[str] = None
+    provider_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=utcnow)
+    sent_at: Optional[datetime] = None
+
+class EmailStatus(SQLModel):
+    id: str
+    to_email: str
+    recipient_type: str = "to"
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
@@ -0,0 +1,11 @@
+from datetime import datetime, timezone
+from sqlmodel import SQLModel, Field
+
+class EntrepriseLogo(SQLModel, table=True):
+    # Logo bytes live here, out of the Entreprise row (which only keeps a short URL)
+    entreprise_id: int = Field(foreign_key="entreprise.id", primary_key=True)
+    variant: str = Field(primary_key=True) # thumb, print
+    content_type: str = "image/png"
+    version: str # Content hash, used for cache busting in the public URL
+    data: bytes
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -12,3 +12,8 @@ class PriceItemBase(SQLModel):
 
 class PriceItem(PriceItemBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+
+class CatalogVersion(SQLModel, table=True):
+    # One row per enterprise, incremented by every write to its PriceItems (see catalog_service)
+    entreprise_id: int = Field(foreign_key="entreprise.id", primary_key=True)
+    version: int = 0
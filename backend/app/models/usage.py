@@ -0,0 +1,31 @@
+from datetime import date, datetime, timezone
+from typing import List, Optional
+from sqlmodel import SQLModel, Field
+
+class LLMUsage(SQLModel, table=True):
+    # One row per LLM call (audit / per-quote cost). Reports read LLMUsageDaily.
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entreprise_nom: str = Field(index=True)
+    devis_id: Optional[str] = None
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0 # Part of prompt_tokens served from the provider's prompt cache
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class LLMUsageDaily(SQLModel, table=True):
+    # Rollup maintained with an upsert at each call: one row per entreprise, day (UTC) and model
+    entreprise_nom: str = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    model: str = Field(primary_key=True)
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+
+class UsageReport(SQLModel):
+    entreprise_nom: str
+    tokens_today: int
+    soft_budget: int # 0 = no budget
+    hard_budget: int
+    days: List[LLMUsageDaily]
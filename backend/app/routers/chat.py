@@ -1,179 +1,180 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import Optional, List
-from pydantic import BaseModel
-
-from ..db.database import get_session
-from ..models.devis import Devis, Ligne
-from ..models.client import Client
-from ..models.entreprise import Entreprise
-from ..services.llm_service import propose_quote_update
-from ..services.calc_service import compute_totaux
-
-router = APIRouter()
-
-class TurnIn(BaseModel):
-    session_id: str
-    message: str
-    includeDetailedDescription: bool = False
-    price_list: Optional[List[dict]] = None
-    image_base64: Optional[str] = None
-
-@router.post("/chat/turn")
-def chat_turn(inp: TurnIn, session: Session = Depends(get_session)):
-    # ... (existing code) ...
-    
-    # ... (existing code finding devis) ...
-    statement = select(Devis).where(Devis.id == inp.session_id)
-    devis = session.exec(statement).first()
-    
-    if not devis:
-        raise HTTPException(status_code=404, detail="Session/Devis not found")
-
-    # 2. Call LLM Service
-    llm_response = propose_quote_update(
-        message_user=inp.message,
-        devis=devis,
-        include_detailed_description=inp.includeDetailedDescription,
-        price_list=inp.price_list,
-        image_base64=inp.image_base64
-    )
-    
-    # 3. Apply actions
-    if llm_response.action == "update_quote":
-        # Strategy: Replace ALL lines to avoid duplication/state issues.
-        # The LLM is instructed to return the full state.
-        
-        # Delete existing lines
-        for old_line in devis.lignes:
-            session.delete(old_line)
-        
-        # Add new lines
-        for l in llm_response.lines:
-            new_line = Ligne(
-                designation=l.label,
-                qte=l.quantity,
-                unite=l.unit,
-                pu_ht=l.unit_price_ht,
-                tva=l.tva_rate,
-                lot=l.lot,
-                note=l.note,
-                devis_id=devis.id
-            )
-            session.add(new_line)
-        
-        if llm_response.detailed_description:
-            devis.detailed_description = llm_response.detailed_description
-            session.add(devis)
-            
-        session.commit()
-        session.refresh(devis)
-    
-    # 4. Compute Totals
-    totaux = compute_totaux(devis)
-    
-    # 5. Format Response (Compatible with old frontend)
-    # Old frontend expects: { session_id, assistant_message, chips, devis_id, devis: {...} }
-    
-    # We need to serialize Devis with lines and totals
-    devis_dict = devis.dict()
-    devis_dict["lignes"] = [l.dict() for l in devis.lignes]
-    devis_dict["totaux"] = totaux
-    # Add meta fields expected by old front
-    devis_dict["meta"] = {
-        "devis_id": devis.id,
-        "date": devis.date,
-        "statut": devis.statut,
-        "theme": devis.theme,
-        "accent_hex": devis.accent_hex,
-        "objet": devis.objet
-    }
-    # Add client/entreprise if needed by front (it usually expects them nested)
-    if devis.client:
-        devis_dict["client"] = devis.client.dict()
-    
-    # Chips logic (simple)
-    chips = []
-    if devis.lignes:
-        chips = ["Voir PDF", "Modifier"]
-
-    return {
-        "session_id": inp.session_id,
-        "assistant_message": llm_response.assistant_message,
-        "chips": chips,
-        "devis_id": devis.id,
-        "devis": devis_dict
-    }
-
-class StartIn(BaseModel):
-    client_id: Optional[str] = None
-    client: Optional[dict] = None # We accept a dict to be flexible, or we could use ClientBase
-    theme: str = "modern_plus"
-    entreprise_nom: Optional[str] = None
-
-@router.post("/chat/start")
-def chat_start(inp: StartIn, session: Session = Depends(get_session)):
-    from sqlalchemy import func
-    
-    # Calculate next number for this enterprise
-    # Default to 1 if no quotes exist
-    next_num = 1
-    if inp.entreprise_nom:
-        statement = select(func.max(Devis.number)).where(Devis.entreprise_nom == inp.entreprise_nom)
-        max_num = session.exec(statement).first()
-        if max_num:
-            next_num = max_num + 1
-
-    # Create new Devis
-    new_devis = Devis(
-        theme=inp.theme, 
-        entreprise_nom=inp.entreprise_nom,
-        number=next_num
-    )
-    
-    if inp.client_id:
-        new_devis.client_id = inp.client_id
-    elif inp.client:
-        # Create new client from data
-        # Handle 'type' -> 'client_type' mapping manually or rely on model
-        client_data = inp.client.copy()
-        if 'type' in client_data:
-            client_data['client_type'] = client_data.pop('type')
-            
-        new_client = Client(**client_data)
-        session.add(new_client)
-        session.commit()
-        session.refresh(new_client)
-        new_devis.client_id = new_client.id
-    
-    session.add(new_devis)
-    session.commit()
-    session.refresh(new_devis)
-    
-    # Return compatible response
-    # session_id = devis_id for simplicity in this new architecture
-    # Compute initial totals (should be 0)
-    from ..services.calc_service import compute_totaux
-    totaux = compute_totaux(new_devis)
-
-    devis_dict = new_devis.dict()
-    devis_dict["lignes"] = []
-    devis_dict["totaux"] = totaux
-    devis_dict["meta"] = {
-        "devis_id": new_devis.id,
-        "date": new_devis.date,
-        "statut": new_devis.statut,
-        "theme": new_devis.theme,
-        "accent_hex": new_devis.accent_hex,
-        "objet": new_devis.objet
-    }
-    if new_devis.client:
-        devis_dict["client"] = new_devis.client.dict()
-
-    return {
-        "session_id": new_devis.id, 
-        "assistant_message": "Bonjour ! Je suis prêt à créer votre devis. Dites-moi ce qu'il faut chiffrer.",
-        "chips": [],
-        "devis_id": new_devis.id,
-        "devis": devis_dict
-    }
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from sqlmodel import delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional, List
+import logging
+from pydantic import BaseModel, ValidationError
+
+from ..db.database import get_session
+from ..db.repository import get_devis_full
+from ..models.devis import Devis, Ligne
+from ..models.client import Client
+from ..models.entreprise import Entreprise
+from ..services.calc_service import compute_totaux
+from ..services.chat_service import chips_for, run_turn, schedule_summary
+from ..services.numbering_service import next_devis_number
+from ..services.timing import span
+from ..services.usage_service import BudgetExceeded
+from ..services import live_sessions
+from ..services.devis_serializer import chat_response
+from ..models.chat import ChatResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class TurnIn(BaseModel):
+    session_id: str
+    message: str
+    includeDetailedDescription: bool = False
+    # No price_list: the server uses its catalog snapshot (ignored if an old client sends it)
+    image_base64: Optional[str] = None
+
+@router.post("/chat/turn", response_model=ChatResponse)
+async def chat_turn(inp: TurnIn, background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_session)):
+    # A WebSocket session of this devis may hold lines not written yet (write-behind)
+    await live_sessions.flush(inp.session_id)
+
+    # Devis + client + lignes in 2 queries (lines are needed by the LLM context)
+    devis = await get_devis_full(session, inp.session_id)
+    
+    if not devis:
+        raise HTTPException(status_code=404, detail="Session/Devis not found")
+
+    # 2. Call LLM Service (budget, memory, admission, usage: see chat_service)
+    try:
+        result = await run_turn(session, devis, inp.message, inp.includeDetailedDescription, inp.image_base64)
+    except BudgetExceeded:
+        raise HTTPException(status_code=429, detail="Budget IA journalier atteint pour cette entreprise")
+    llm_response = result.llm_response
+    
+    # 3. Apply actions
+    if result.lines is not None:
+        # Delete existing lines (single DELETE instead of one per line)
+        await session.exec(delete(Ligne).where(Ligne.devis_id == devis.id))
+        session.add_all(result.lines)
+        
+        if llm_response.detailed_description:
+            devis.detailed_description = llm_response.detailed_description
+            session.add(devis)
+            
+        await session.commit()
+        # Reload lines + client eagerly (the collection still holds the deleted lines)
+        devis = await get_devis_full(session, devis.id)
+        # Connected WebSocket clients get the new state
+        await live_sessions.reload(devis.id)
+    else:
+        await session.commit()
+
+    # Runs after the response is sent
+    schedule_summary(result, devis.id, background_tasks)
+    
+    # 4. Compute Totals
+    with span("calc"):
+        totaux = compute_totaux(devis)
+
+    # 5. Format Response (Compatible with old frontend, see ChatResponse)
+    with span("serialize"):
+        return chat_response(inp.session_id, llm_response.assistant_message, chips_for(devis), devis, totaux, client=devis.client)
+
+class WsTurnIn(BaseModel):
+    message: str
+    includeDetailedDescription: bool = False
+    # No price_list: the server uses its catalog snapshot (ignored if an old client sends it)
+    image_base64: Optional[str] = None
+    turn_id: Optional[str] = None # Set by the client: a turn resent after a reconnect is not replayed
+
+@router.websocket("/ws/chat/{session_id}")
+async def chat_ws(websocket: WebSocket, session_id: str, epoch: Optional[str] = None, version: Optional[int] = None):
+    """
+    Chat session over a WebSocket, the devis being held in memory (services/live_sessions.py).
+    Client -> server: {"type": "turn", "message": ..., "includeDetailedDescription", "image_base64", "turn_id"}
+    Server -> client:
+    - {"type": "snapshot", "epoch", "version", "devis"}: full devis (first connection, or too far behind)
+    - {"type": "patch", "epoch", "version", "assistant_message", "chips", "lines"?, "totaux"?, "fields"?, "turn_id"}
+    - {"type": "ready", "epoch", "version"}: resumed, nothing missed
+    - {"type": "error", "status", "detail", "retry_after"?, "turn_id"?}
+    Resume after a disconnect: /ws/chat/{session_id}?epoch=...&version=<last applied>
+    """
+    await websocket.accept()
+    try:
+        live = await live_sessions.attach(session_id, websocket)
+    except LookupError:
+        await websocket.close(code=4404, reason="Session/Devis not found")
+        return
+    try:
+        for message in live.resume(epoch, version):
+            await websocket.send_text(live_sessions.dumps(message))
+        while True:
+            data = await websocket.receive_json()
+            try:
+                if data.get("type") != "turn":
+                    raise ValueError(f"unknown message type {data.get('type')!r}")
+                inp = WsTurnIn.model_validate(data)
+            except (ValueError, ValidationError, AttributeError) as e:
+                await websocket.send_text(live_sessions.dumps({"type": "error", "status": 400, "detail": str(e)}))
+                continue
+            try:
+                await live.turn(websocket, inp.message, inp.includeDetailedDescription, inp.image_base64, inp.turn_id)
+            except Exception as e:
+                logger.exception("WebSocket chat turn failed", extra={"devis_id": session_id})
+                await websocket.send_text(live_sessions.dumps({"type": "error", "status": 500, "detail": f"Internal Server Error: {e}", "turn_id": inp.turn_id}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_sessions.detach(live, websocket)
+
+class StartIn(BaseModel):
+    client_id: Optional[str] = None
+    client: Optional[dict] = None # We accept a dict to be flexible, or we could use ClientBase
+    theme: str = "modern_plus"
+    entreprise_nom: Optional[str] = None
+
+@router.post("/chat/start", response_model=ChatResponse)
+async def chat_start(inp: StartIn, session: AsyncSession = Depends(get_session)):
+    # Allocate next number for this enterprise (atomic counter, committed with the devis)
+    # Default to 1 if no enterprise
+    next_num = 1
+    if inp.entreprise_nom:
+        next_num = await next_devis_number(session, inp.entreprise_nom)
+
+    # Create new Devis
+    new_devis = Devis(
+        theme=inp.theme, 
+        entreprise_nom=inp.entreprise_nom,
+        number=next_num,
+        lignes=[]
+    )
+    
+    client = None
+    if inp.client_id:
+        new_devis.client_id = inp.client_id
+        client = await session.get(Client, inp.client_id)
+    elif inp.client:
+        # Create new client from data
+        # Handle 'type' -> 'client_type' mapping manually or rely on model
+        client_data = inp.client.copy()
+        if 'type' in client_data:
+            client_data['client_type'] = client_data.pop('type')
+            
+        client = Client(**client_data)
+        session.add(client)
+        new_devis.client_id = client.id
+    
+    # Client + Devis in a single transaction (ids are generated client-side)
+    session.add(new_devis)
+    await session.commit()
+    
+    # Return compatible response
+    # session_id = devis_id for simplicity in this new architecture
+    # Compute initial totals (should be 0)
+    totaux = compute_totaux(new_devis)
+
+    return chat_response(
+        new_devis.id,
+        "Bonjour ! Je suis prêt à créer votre devis. Dites-moi ce qu'il faut chiffrer.",
+        [],
+        new_devis,
+        totaux,
+        client=client
+    )
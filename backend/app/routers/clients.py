@@ -1,28 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import List, Optional
-from ..db.database import get_session
-from ..models.client import Client
-
-router = APIRouter()
-
-@router.post("/clients", response_model=Client)
-def create_client(client: Client, session: Session = Depends(get_session)):
-    session.add(client)
-    session.commit()
-    session.refresh(client)
-    return client
-
-@router.get("/clients", response_model=List[Client])
-def search_clients(q: Optional[str] = None, entreprise_nom: Optional[str] = None, session: Session = Depends(get_session)):
-    statement = select(Client)
-    
-    # Filter by Enterprise
-    if entreprise_nom:
-        statement = statement.where(Client.entreprise_nom == entreprise_nom)
-        
-    if q:
-        statement = statement.where(Client.nom.contains(q))
-    
-    statement = statement.limit(10)
-    return session.exec(statement).all()
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from ..db.database import get_session
+from ..models.client import Client
+
+router = APIRouter()
+
+@router.post("/clients", response_model=Client)
+async def create_client(client: Client, session: AsyncSession = Depends(get_session)):
+    session.add(client)
+    await session.commit()
+    await session.refresh(client)
+    return client
+
+@router.get("/clients", response_model=List[Client])
+async def search_clients(q: Optional[str] = None, entreprise_nom: Optional[str] = None, session: AsyncSession = Depends(get_session)):
+    statement = select(Client)
+    
+    # Filter by Enterprise
+    if entreprise_nom:
+        statement = statement.where(Client.entreprise_nom == entreprise_nom)
+        
+    if q:
+        statement = statement.where(Client.nom.contains(q))
+    
+    statement = statement.limit(10)
+    return (await session.exec(statement)).all()
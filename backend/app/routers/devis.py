@@ -1,145 +1,218 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
-from sqlmodel import Session, select
-from typing import List, Optional
-import io
-
-from ..db.database import get_session
-from ..models.devis import Devis, DevisUpdate
-from ..models.entreprise import Entreprise
-from ..services.pdf_service import generate_pdf
-from ..services.email_service import send_email
-from pydantic import BaseModel, EmailStr
-
-router = APIRouter()
-
-class EmailRequest(BaseModel):
-    to_email: EmailStr
-    subject: str
-    message: str
-
-
-@router.patch("/devis/{devis_id}", response_model=Devis)
-def update_devis(devis_id: str, devis_update: DevisUpdate, session: Session = Depends(get_session)):
-    devis = session.get(Devis, devis_id)
-    if not devis:
-        raise HTTPException(status_code=404, detail="Devis introuvable")
-    
-    devis_data = devis_update.dict(exclude_unset=True)
-    for key, value in devis_data.items():
-        setattr(devis, key, value)
-    
-    session.add(devis)
-    session.commit()
-    session.refresh(devis)
-    return devis
-
-@router.get("/devis", response_model=List[Devis])
-def list_devis(entreprise_nom: Optional[str] = None, session: Session = Depends(get_session)):
-    statement = select(Devis)
-    if entreprise_nom:
-        statement = statement.where(Devis.entreprise_nom == entreprise_nom)
-    # Sort by date desc
-    statement = statement.order_by(Devis.date.desc())
-    return session.exec(statement).all()
-
-@router.get("/devis/{devis_id}/pdf")
-def get_devis_pdf(devis_id: str, session: Session = Depends(get_session)):
-    devis = session.get(Devis, devis_id)
-    if not devis:
-        raise HTTPException(status_code=404, detail="Devis introuvable")
-    
-    # Get Entreprise (Singleton ID=1)
-    # Get associated Enterprise
-    # 2. Get Entreprise
-    # Fallback: if devis has no entreprise_nom (old data), try to get from client
-    if not devis.entreprise_nom and devis.client and devis.client.entreprise_nom:
-        devis.entreprise_nom = devis.client.entreprise_nom
-        session.add(devis)
-        session.commit()
-        session.refresh(devis)
-    
-    if not devis.entreprise_nom:
-         raise HTTPException(status_code=400, detail="Devis sans entreprise associée")
-
-    ent_stmt = select(Entreprise).where(Entreprise.nom == devis.entreprise_nom)
-    entreprise = session.exec(ent_stmt).first()
-
-    if not entreprise:
-        raise HTTPException(status_code=404, detail="L'entreprise associée à ce devis n'existe plus")
-    
-    pdf_bytes = generate_pdf(devis, entreprise)
-    
-    # Determine filename
-    
-    # Determine filename
-    filename = f"Devis-{devis.readable_id}.pdf"
-    if devis.objet:
-        # Basic sanitization
-        safe_name = "".join([c if c.isalnum() or c in (' ', '-', '_') else '_' for c in devis.objet])
-        safe_name = safe_name.strip().replace(' ', '_')
-        if safe_name:
-            filename = f"Devis-{devis.readable_id}-{safe_name}.pdf"
-
-    return StreamingResponse(
-        io.BytesIO(pdf_bytes),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
-
-@router.post("/devis/{devis_id}/send")
-async def send_devis_email(devis_id: str, email_req: EmailRequest, session: Session = Depends(get_session)):
-    # 1. Reuse logic to get Devis + Enterprise + PDF bytes
-    devis = session.get(Devis, devis_id)
-    if not devis:
-        raise HTTPException(status_code=404, detail="Devis introuvable")
-    
-    # Ensure Enterprise linkage
-    if not devis.entreprise_nom and devis.client and devis.client.entreprise_nom:
-        devis.entreprise_nom = devis.client.entreprise_nom
-    
-    if not devis.entreprise_nom:
-         raise HTTPException(status_code=400, detail="Devis sans entreprise associée")
-
-    ent_stmt = select(Entreprise).where(Entreprise.nom == devis.entreprise_nom)
-    entreprise = session.exec(ent_stmt).first()
-
-    if not entreprise:
-        raise HTTPException(status_code=404, detail="L'entreprise associée n'existe plus")
-    
-    # Generate PDF
-    pdf_bytes = generate_pdf(devis, entreprise)
-    
-    # Determine filename
-    # Determine filename
-    filename = f"Devis-{devis.readable_id}.pdf"
-    if devis.objet:
-        safe_name = "".join([c if c.isalnum() or c in (' ', '-', '_') else '_' for c in devis.objet])
-        safe_name = safe_name.strip().replace(' ', '_')
-        if safe_name: filename = f"Devis-{devis.readable_id}-{safe_name}.pdf"
-
-    # 2. Attachments
-    # UploadFile-like structure for fastapi-mail? No, MessageSchema takes 'attachments' as files or UploadFile.
-    # But valid attachments can be dicts or bytes?
-    # According to fastapi-mail docs, we can pass a list of UploadFile OR a list of dicts.
-    # However, passing in-memory bytes is tricky with fastapi-mail < 1.0. 
-    # Workaround: Use EmailSchema with 'attachments' as list of files or paths.
-    # For in-memory bytes, version 1.4+ supports it via a specific class or dict.
-    # Let's try the dict format: {'file': bytes, 'filename': str, 'content_type': str, 'headers': dict}
-    
-    attachment = {
-        "file": pdf_bytes,
-        "filename": filename,
-        "content_type": "application/pdf",
-        "headers": {}
-    }
-
-    # 3. Send Email
-    await send_email(
-        recipients=[email_req.to_email],
-        subject=email_req.subject,
-        body=email_req.message,
-        attachments=[attachment]
-    )
-    
-    return {"ok": True, "detail": "Email envoyé avec succès"}
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+import io
+import os
+
+from ..db.database import get_session
+from ..db.repository import get_devis_with_entreprise
+from ..models.devis import Devis, DevisUpdate
+from ..models.entreprise import Entreprise
+from ..services.logo_service import get_print_logo
+from ..services.email_service import EmailService
+from ..services.email_outbox import wait_for_delivery, wake_outbox_worker, watch_delivery
+from ..services.timing import span
+from ..services.admission import admit
+from ..services import live_sessions
+from ..services.metrics import PDF_RENDER_SECONDS
+from ..models.email import EmailOutbox
+from pydantic import BaseModel, EmailStr
+
+router = APIRouter()
+
+MAX_RECIPIENTS = int(os.getenv("EMAIL_MAX_RECIPIENTS", "20"))
+# How long /send waits for the first delivery attempts before answering "pending"
+SEND_WAIT_SECONDS = float(os.getenv("EMAIL_SEND_WAIT_SECONDS", "3"))
+
+class EmailRequest(BaseModel):
+    to_email: Optional[EmailStr] = None # legacy single recipient, same as to=[...]
+    to: List[EmailStr] = []
+    cc: List[EmailStr] = []
+    bcc: List[EmailStr] = []
+    subject: str
+    message: str
+
+    def recipients(self) -> List[tuple]:
+        """(email, type) pairs, deduplicated (an address keeps its first, most visible, type)."""
+        pairs = []
+        seen = set()
+        to = ([self.to_email] if self.to_email else []) + list(self.to)
+        for recipient_type, emails in (("to", to), ("cc", self.cc), ("bcc", self.bcc)):
+            for email in emails:
+                key = email.lower()
+                if key not in seen:
+                    seen.add(key)
+                    pairs.append((email, recipient_type))
+        return pairs
+
+
+@router.patch("/devis/{devis_id}", response_model=Devis)
+async def update_devis(devis_id: str, devis_update: DevisUpdate, session: AsyncSession = Depends(get_session)):
+    await live_sessions.flush(devis_id)
+    devis = await session.get(Devis, devis_id)
+    if not devis:
+        raise HTTPException(status_code=404, detail="Devis introuvable")
+    
+    devis_data = devis_update.dict(exclude_unset=True)
+    for key, value in devis_data.items():
+        setattr(devis, key, value)
+    
+    session.add(devis)
+    await session.commit()
+    await session.refresh(devis)
+    # Connected WebSocket clients get the new state
+    await live_sessions.reload(devis_id)
+    return devis
+
+@router.get("/devis", response_model=List[Devis])
+async def list_devis(entreprise_nom: Optional[str] = None, session: AsyncSession = Depends(get_session)):
+    statement = select(Devis)
+    if entreprise_nom:
+        statement = statement.where(Devis.entreprise_nom == entreprise_nom)
+    # Sort by date desc
+    statement = statement.order_by(Devis.date.desc())
+    return (await session.exec(statement)).all()
+
+@router.get("/devis/{devis_id}/pdf")
+async def get_devis_pdf(devis_id: str, session: AsyncSession = Depends(get_session)):
+    # Lines of a WebSocket session not written yet (write-behind)
+    await live_sessions.flush(devis_id)
+    # Devis + lignes + client + entreprise in 2 queries
+    devis, entreprise = await get_devis_with_entreprise(session, devis_id)
+    if not devis:
+        raise HTTPException(status_code=404, detail="Devis introuvable")
+    
+    # Get Entreprise (Singleton ID=1)
+    # Get associated Enterprise
+    # 2. Get Entreprise
+    # Fallback: if devis has no entreprise_nom (old data), try to get from client
+    if not devis.entreprise_nom and devis.client and devis.client.entreprise_nom:
+        devis.entreprise_nom = devis.client.entreprise_nom
+        session.add(devis)
+        await session.commit()
+    
+    if not devis.entreprise_nom:
+         raise HTTPException(status_code=400, detail="Devis sans entreprise associée")
+
+    if not entreprise:
+        raise HTTPException(status_code=404, detail="L'entreprise associée à ce devis n'existe plus")
+    
+    logo = await get_print_logo(session, entreprise)
+    # ReportLab is CPU-bound: render off the event loop
+    from ..services.pdf_service import generate_pdf # ReportLab is only loaded by the first PDF
+    # No pooled connection held while queued or rendering (everything is loaded)
+    await session.commit()
+    # Per-entreprise rate limit + fair queue (AdmissionRejected -> 429 with Retry-After)
+    async with admit(devis.entreprise_nom, "pdf"):
+        with span("pdf"), PDF_RENDER_SECONDS.time():
+            pdf_bytes = await run_in_threadpool(generate_pdf, devis, entreprise, logo)
+    
+    # Determine filename
+    
+    # Determine filename
+    filename = f"Devis-{devis.readable_id}.pdf"
+    if devis.objet:
+        # Basic sanitization
+        safe_name = "".join([c if c.isalnum() or c in (' ', '-', '_') else '_' for c in devis.objet])
+        safe_name = safe_name.strip().replace(' ', '_')
+        if safe_name:
+            filename = f"Devis-{devis.readable_id}-{safe_name}.pdf"
+
+    return StreamingResponse(
+        io.BytesIO(pdf_bytes),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/devis/{devis_id}/send")
+async def send_devis_email(devis_id: str, email_req: EmailRequest, session: AsyncSession = Depends(get_session)):
+    recipients = email_req.recipients()
+    if not recipients:
+        raise HTTPException(status_code=400, detail="Aucun destinataire")
+    if len(recipients) > MAX_RECIPIENTS:
+        raise HTTPException(status_code=400, detail=f"Trop de destinataires (maximum {MAX_RECIPIENTS})")
+
+    # 1. Reuse logic to get Devis + Enterprise + PDF bytes
+    await live_sessions.flush(devis_id) # Lines of a WebSocket session not written yet
+    devis, entreprise = await get_devis_with_entreprise(session, devis_id)
+    if not devis:
+        raise HTTPException(status_code=404, detail="Devis introuvable")
+    
+    # Ensure Enterprise linkage
+    if not devis.entreprise_nom and devis.client and devis.client.entreprise_nom:
+        devis.entreprise_nom = devis.client.entreprise_nom
+    
+    if not devis.entreprise_nom:
+         raise HTTPException(status_code=400, detail="Devis sans entreprise associée")
+
+    if not entreprise:
+        raise HTTPException(status_code=404, detail="L'entreprise associée n'existe plus")
+    
+    # Generate PDF (once, whatever the number of recipients)
+    logo = await get_print_logo(session, entreprise)
+    from ..services.pdf_service import generate_pdf # ReportLab is only loaded by the first PDF
+    with span("pdf"), PDF_RENDER_SECONDS.time():
+        pdf_bytes = await run_in_threadpool(generate_pdf, devis, entreprise, logo)
+    
+    # Determine filename
+    filename = f"Devis-{devis.readable_id}.pdf"
+    if devis.objet:
+        safe_name = "".join([c if c.isalnum() or c in (' ', '-', '_') else '_' for c in devis.objet])
+        safe_name = safe_name.strip().replace(' ', '_')
+        if safe_name: filename = f"Devis-{devis.readable_id}-{safe_name}.pdf"
+
+    # 2. Queue one email per recipient (outbox), all sharing the same stored attachment.
+    # Each recipient gets its own copy: a bad address can't fail the others and
+    # cc/bcc addresses are never disclosed. The worker delivers them concurrently
+    # (EMAIL_WORKER_CONCURRENCY) with per-email retries.
+    attachment = EmailService.queue_attachment(session, filename, pdf_bytes, "application/pdf")
+    emails = [
+        EmailService.queue_email(
+            session,
+            to_email=to_email,
+            subject=email_req.subject,
+            html_content=email_req.message,
+            attachment_id=attachment.id,
+            recipient_type=recipient_type
+        )
+        for to_email, recipient_type in recipients
+    ]
+    email_ids = [email.id for email in emails]
+    futures = watch_delivery(email_ids)
+    await session.commit()
+    wake_outbox_worker()
+
+    # 3. Wait (bounded) for the first attempts, then report each recipient's status
+    with span("email"):
+        await wait_for_delivery(email_ids, futures, SEND_WAIT_SECONDS)
+    rows = (await session.exec(
+        select(EmailOutbox).where(EmailOutbox.id.in_(email_ids)).execution_options(populate_existing=True)
+    )).all()
+    by_id = {row.id: row for row in rows}
+    results = [
+        {
+            "email": by_id[email_id].to_email,
+            "type": by_id[email_id].recipient_type,
+            "email_id": email_id,
+            "status": by_id[email_id].status,
+            "error": by_id[email_id].last_error,
+        }
+        for email_id in email_ids
+    ]
+
+    sent = sum(1 for r in results if r["status"] == "sent")
+    failed = sum(1 for r in results if r["status"] == "dead")
+    if sent == len(results):
+        detail = "Email envoyé" if sent == 1 else f"Email envoyé à {sent} destinataires"
+    elif failed:
+        detail = f"{sent}/{len(results)} envoyé(s), {failed} en échec"
+    else:
+        detail = f"{sent}/{len(results)} envoyé(s), le reste en cours d'envoi"
+    response = {"ok": failed == 0, "detail": detail, "recipients": results}
+    # Single-recipient shape kept for existing clients
+    response["email_id"] = results[0]["email_id"]
+    response["status"] = results[0]["status"]
+    return response
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db.database import get_session
+from ..models.email import EmailOutbox, EmailStatus
+
+router = APIRouter()
+
+@router.get("/emails/{email_id}", response_model=EmailStatus)
+async def get_email_status(email_id: str, session: AsyncSession = Depends(get_session)):
+    # Delivery status of a queued email: pending, sending, sent or dead (gave up after retries)
+    email = await session.get(EmailOutbox, email_id)
+    if not email:
+        raise HTTPException(status_code=404, detail="Email introuvable")
+    return email
@@ -1,51 +1,120 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from passlib.context import CryptContext
-from ..db.database import get_session
-from ..models.entreprise import Entreprise, EntrepriseBase, EntrepriseCreate, EntrepriseLogin, EntrepriseUpdate
-
-router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-@router.post("/entreprise/login")
-def login_entreprise(data: EntrepriseLogin, session: Session = Depends(get_session)):
-    statement = select(Entreprise).where(Entreprise.nom == data.nom)
-    ent = session.exec(statement).first()
-    if not ent:
-        raise HTTPException(status_code=404, detail="Entreprise non trouvée")
-    
-    if not ent.password_hash or not pwd_context.verify(data.password, ent.password_hash):
-         raise HTTPException(status_code=401, detail="Mot de passe incorrect")
-         
-    return ent
-
-@router.post("/entreprise/register")
-def register_entreprise(data: EntrepriseCreate, session: Session = Depends(get_session)):
-    statement = select(Entreprise).where(Entreprise.nom == data.nom)
-    existing = session.exec(statement).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Cette entreprise existe déjà")
-    
-    hashed_password = pwd_context.hash(data.password)
-    ent_data = data.dict(exclude={"password"})
-    ent = Entreprise(**ent_data, password_hash=hashed_password)
-    
-    session.add(ent)
-    session.commit()
-    session.refresh(ent)
-    return ent
-
-@router.patch("/entreprise/{entreprise_id}")
-def update_entreprise(entreprise_id: int, data: EntrepriseUpdate, session: Session = Depends(get_session)):
-    ent = session.get(Entreprise, entreprise_id)
-    if not ent:
-        raise HTTPException(status_code=404, detail="Entreprise non trouvée")
-    
-    hero_data = data.dict(exclude_unset=True)
-    for key, value in hero_data.items():
-        setattr(ent, key, value)
-        
-    session.add(ent)
-    session.commit()
-    session.refresh(ent)
-    return ent
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db.database import get_session
+from ..models.entreprise import Entreprise, EntrepriseBase, EntrepriseCreate, EntrepriseLogin, EntrepriseUpdate, EntreprisePublic
+from ..services.entreprise_cache import get_entreprise_by_nom, invalidate_entreprise
+from ..services.logo_service import InvalidLogo, LOGO_VARIANTS, is_data_uri, save_logo, delete_logo, get_logo
+
+router = APIRouter()
+_pwd_context = None
+
+def get_pwd_context():
+    # passlib + bcrypt backend are loaded by the first login/register, not at startup
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+async def _store_logo(session: AsyncSession, ent: Entreprise, data_uri: str):
+    try:
+        await save_logo(session, ent, data_uri)
+    except InvalidLogo as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/entreprise/login", response_model=EntreprisePublic)
+async def login_entreprise(data: EntrepriseLogin, session: AsyncSession = Depends(get_session)):
+    ent = await get_entreprise_by_nom(session, data.nom)
+    if not ent:
+        raise HTTPException(status_code=404, detail="Entreprise non trouvée")
+    
+    # bcrypt is deliberately slow: keep it off the event loop
+    if not ent.password_hash or not await run_in_threadpool(get_pwd_context().verify, data.password, ent.password_hash):
+         raise HTTPException(status_code=401, detail="Mot de passe incorrect")
+
+    # Legacy row with an inline base64 logo: move it to the logo store once
+    if is_data_uri(ent.logo_url):
+        db_ent = await session.get(Entreprise, ent.id)
+        try:
+            await save_logo(session, db_ent, db_ent.logo_url)
+        except InvalidLogo:
+            db_ent.logo_url = None
+            session.add(db_ent)
+        await session.commit()
+        invalidate_entreprise(db_ent.nom)
+        ent = db_ent
+         
+    return ent
+
+@router.post("/entreprise/register", response_model=EntreprisePublic)
+async def register_entreprise(data: EntrepriseCreate, session: AsyncSession = Depends(get_session)):
+    statement = select(Entreprise).where(Entreprise.nom == data.nom)
+    existing = (await session.exec(statement)).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Cette entreprise existe déjà")
+    
+    hashed_password = await run_in_threadpool(get_pwd_context().hash, data.password)
+    ent_data = data.dict(exclude={"password"})
+    logo_data_uri = ent_data.pop("logo_url") if is_data_uri(ent_data.get("logo_url")) else None
+    ent = Entreprise(**ent_data, password_hash=hashed_password)
+    
+    session.add(ent)
+    try:
+        # Flush only: the logo needs ent.id, and an invalid logo must not leave the account behind
+        await session.flush()
+    except IntegrityError:
+        # Concurrent registration of the same name (unique index on nom)
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="Cette entreprise existe déjà")
+    if logo_data_uri:
+        try:
+            await _store_logo(session, ent, logo_data_uri)
+        except HTTPException:
+            await session.rollback()
+            raise
+    await session.commit()
+    await session.refresh(ent)
+    invalidate_entreprise(ent.nom)
+    return ent
+
+@router.patch("/entreprise/{entreprise_id}", response_model=EntreprisePublic)
+async def update_entreprise(entreprise_id: int, data: EntrepriseUpdate, session: AsyncSession = Depends(get_session)):
+    ent = await session.get(Entreprise, entreprise_id)
+    if not ent:
+        raise HTTPException(status_code=404, detail="Entreprise non trouvée")
+    
+    old_nom = ent.nom
+    hero_data = data.dict(exclude_unset=True)
+    new_logo = hero_data.pop("logo_url", ent.logo_url)
+    for key, value in hero_data.items():
+        setattr(ent, key, value)
+
+    if is_data_uri(new_logo):
+        await _store_logo(session, ent, new_logo)
+    elif new_logo != ent.logo_url:
+        # Removed, or replaced by an external URL
+        await delete_logo(session, ent.id)
+        ent.logo_url = new_logo
+        
+    session.add(ent)
+    await session.commit()
+    await session.refresh(ent)
+    invalidate_entreprise(old_nom, ent.nom)
+    return ent
+
+@router.get("/entreprise/{entreprise_id}/logo/{variant}")
+async def get_entreprise_logo(entreprise_id: int, variant: str, session: AsyncSession = Depends(get_session)):
+    if variant not in LOGO_VARIANTS:
+        raise HTTPException(status_code=404, detail="Format de logo inconnu")
+    logo = await get_logo(session, entreprise_id, variant)
+    if not logo:
+        raise HTTPException(status_code=404, detail="Logo introuvable")
+    # URLs carry ?v=<content hash>: the bytes behind one URL never change
+    return Response(
+        content=logo.data,
+        media_type=logo.content_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{logo.version}"'},
+    )
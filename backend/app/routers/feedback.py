@@ -1,7 +1,13 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+import logging
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, EmailStr
 from typing import Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db.database import get_session
 from ..services.email_service import EmailService
+from ..services.email_outbox import wake_outbox_worker
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/feedback",
@@ -19,35 +25,35 @@ class QualityAudit(BaseModel):
     user_email: Optional[str] = None
 
 @router.post("/submit_idea")
-def submit_idea(feedback: HomepageFeedback, background_tasks: BackgroundTasks):
+async def submit_idea(feedback: HomepageFeedback, session: AsyncSession = Depends(get_session)):
     try:
-        # Use the service directly
-        # Note: In a real async app we might want to await this or put it in background task wrapper
-        # The service method uses resend synchronously? Resend SDK is sync by default unless async client used.
-        # But our EmailService wrapper is mixed. Let's assume sync for now or background it.
-        
-        # EmailService.send_idea_feedback is likely sync based on previous reads (using resend.Emails.send)
-        # We can run it directly.
-        EmailService.send_idea_feedback(
+        # Queued in the outbox: the provider (slow or down) never delays this request
+        email = EmailService.queue_idea_feedback(
+            session,
             category=feedback.category, 
             message=feedback.message, 
             user_email=feedback.user_email
         )
-        return {"status": "ok", "message": "Feedback envoyé"}
+        await session.commit()
+        wake_outbox_worker()
+        return {"status": "ok", "message": "Feedback envoyé", "email_id": email.id}
     except Exception as e:
-        print(f"Error sending feedback: {e}")
+        logger.exception("Error queuing feedback")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/submit_quality_audit")
-def submit_quality_audit(audit: QualityAudit):
+async def submit_quality_audit(audit: QualityAudit, session: AsyncSession = Depends(get_session)):
     try:
-        EmailService.send_quality_audit(
+        email = EmailService.queue_quality_audit(
+            session,
             score=audit.score,
             details=audit.details,
             user_email=audit.user_email
         )
-        return {"status": "ok", "message": "Audit envoyé"}
+        await session.commit()
+        wake_outbox_worker()
+        return {"status": "ok", "message": "Audit envoyé", "email_id": email.id}
     except Exception as e:
-        print(f"Error sending audit: {e}")
+        logger.exception("Error queuing audit")
         raise HTTPException(status_code=500, detail=str(e))
 
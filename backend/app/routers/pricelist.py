@@ -1,23 +1,45 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from ..db.database import get_session
 from ..models.pricelist import PriceItem
 from ..models.entreprise import Entreprise
+from ..services.admission import admit
+from ..services.catalog_export import build_xlsx, iter_file, stream_csv
+from ..services.catalog_service import bump_catalog_version, catalog_etag, get_catalog, get_catalog_version
+from ..services.entreprise_cache import get_entreprise_by_nom
 
 router = APIRouter()
 
 @router.get("/pricelist", response_model=List[PriceItem])
-def list_items(
+async def list_items(
+    request: Request,
+    response: Response,
     entreprise_nom: str,
     category: Optional[str] = None,
     q: Optional[str] = None,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
     # Find entreprise ID
-    ent = session.exec(select(Entreprise).where(Entreprise.nom == entreprise_nom)).first()
+    ent = await get_entreprise_by_nom(session, entreprise_nom)
     if not ent:
         return []
+
+    # Conditional GET: the catalog version changes with every write to it
+    version = await get_catalog_version(session, ent.id)
+    etag = catalog_etag(ent.id, version, category, q)
+    # The client revalidates each time (304 when unchanged), never uses a stale copy
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    if (not category or category == "Toutes") and not q:
+        # Whole catalog: the snapshot also used by the chat turns
+        _, items = await get_catalog(session, ent.id)
+        return items
         
     query = select(PriceItem).where(PriceItem.entreprise_id == ent.id)
     
@@ -27,57 +49,92 @@ def list_items(
     if q:
         query = query.where(PriceItem.label.contains(q))
         
-    return session.exec(query).all()
+    return (await session.exec(query)).all()
+
+@router.get("/pricelist/export")
+async def export_items(
+    entreprise_nom: str,
+    format: str = "csv",
+    session: AsyncSession = Depends(get_session)
+):
+    # Streamed from a DB cursor by batches: constant memory whatever the catalog size
+    if format not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="Format non supporté (csv ou xlsx)")
+    ent = await get_entreprise_by_nom(session, entreprise_nom)
+    if not ent:
+        raise HTTPException(status_code=404, detail="Entreprise introuvable")
+
+    # ASCII only: header values are latin-1
+    safe_name = "".join([c if (c.isascii() and c.isalnum()) or c in (' ', '-', '_') else '_' for c in ent.nom]).strip().replace(' ', '_')
+    filename = f"Catalogue-{safe_name or ent.id}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "csv":
+        return StreamingResponse(stream_csv(ent.id), media_type="text/csv; charset=utf-8", headers=headers)
+
+    # Per-entreprise rate limit + fair queue (AdmissionRejected -> 429 with Retry-After)
+    async with admit(ent.nom, "export"):
+        xlsx = await build_xlsx(ent.id)
+    return StreamingResponse(
+        iter_file(xlsx),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=headers,
+    )
 
 @router.post("/pricelist", response_model=PriceItem)
-def create_item(
+async def create_item(
     item: PriceItem, 
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
     # Security: Verify entreprise exists (simple check)
     if not item.entreprise_id:
          raise HTTPException(status_code=400, detail="Entreprise ID requis")
 
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    await bump_catalog_version(session, [item.entreprise_id])
+    await session.commit()
+    await session.refresh(item)
     return item
 
 @router.delete("/pricelist/{item_id}")
-def delete_item(item_id: int, session: Session = Depends(get_session)):
-    item = session.get(PriceItem, item_id)
+async def delete_item(item_id: int, session: AsyncSession = Depends(get_session)):
+    item = await session.get(PriceItem, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Article non trouvé")
         
-    session.delete(item)
-    session.commit()
+    await session.delete(item)
+    await bump_catalog_version(session, [item.entreprise_id])
+    await session.commit()
     return {"ok": True}
 
 @router.post("/pricelist/bulk-delete")
-def delete_items(ids: List[int], session: Session = Depends(get_session)):
+async def delete_items(ids: List[int], session: AsyncSession = Depends(get_session)):
     # Verify items belong to same enterprise? 
     # For now, just delete by ID, relying on ID being unique.
     # Ideally checking ownership, but we trust the ID list from frontend context.
     statement = select(PriceItem).where(PriceItem.id.in_(ids))
-    items = session.exec(statement).all()
+    items = (await session.exec(statement)).all()
     
     for item in items:
-        session.delete(item)
+        await session.delete(item)
+    await bump_catalog_version(session, [item.entreprise_id for item in items])
         
-    session.commit()
+    await session.commit()
     return {"count": len(items)}
 
 @router.patch("/pricelist/{item_id}", response_model=PriceItem)
-def update_item(item_id: int, item_data: PriceItem, session: Session = Depends(get_session)):
-    item = session.get(PriceItem, item_id)
+async def update_item(item_id: int, item_data: PriceItem, session: AsyncSession = Depends(get_session)):
+    item = await session.get(PriceItem, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Article non trouvé")
 
+    old_entreprise_id = item.entreprise_id
     update_dict = item_data.dict(exclude_unset=True)
     for key, value in update_dict.items():
          setattr(item, key, value)
 
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    await bump_catalog_version(session, [old_entreprise_id, item.entreprise_id])
+    await session.commit()
+    await session.refresh(item)
     return item
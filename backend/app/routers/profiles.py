@@ -0,0 +1,25 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from ..services.profiler import get_profile_path, is_admin_key, list_profiles
+
+router = APIRouter()
+
+def _check_admin(key: Optional[str], x_admin_key: Optional[str]):
+    if not is_admin_key(x_admin_key or key):
+        raise HTTPException(status_code=403, detail="Clé admin invalide")
+
+@router.get("/admin/profiles")
+def get_profiles(key: Optional[str] = None, x_admin_key: Optional[str] = Header(None)):
+    # Captured with `X-Profile: 1` + `X-Admin-Key` on any request (newest first)
+    _check_admin(key, x_admin_key)
+    return list_profiles()
+
+@router.get("/admin/profiles/{name}")
+def download_profile(name: str, key: Optional[str] = None, x_admin_key: Optional[str] = Header(None)):
+    # .speedscope.json -> https://www.speedscope.app, .pstats -> snakeviz / python -m pstats
+    _check_admin(key, x_admin_key)
+    path = get_profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profil introuvable")
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db.database import get_session
+from ..models.usage import UsageReport
+from ..services.usage_service import (
+    LLM_HARD_BUDGET_TOKENS,
+    LLM_SOFT_BUDGET_TOKENS,
+    get_daily_usage,
+    tokens_used_today,
+)
+
+router = APIRouter()
+
+@router.get("/usage/{entreprise_nom}", response_model=UsageReport)
+async def get_usage(entreprise_nom: str, days: int = Query(30, ge=1, le=366), session: AsyncSession = Depends(get_session)):
+    # LLM tokens consumed per day and model (rollup), plus today's total against the budgets
+    return UsageReport(
+        entreprise_nom=entreprise_nom,
+        tokens_today=await tokens_used_today(session, entreprise_nom),
+        soft_budget=LLM_SOFT_BUDGET_TOKENS,
+        hard_budget=LLM_HARD_BUDGET_TOKENS,
+        days=await get_daily_usage(session, entreprise_nom, days)
+    )
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from .cache import TTLCache
+from .metrics import ADMISSION_IN_USE, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Admission control of the expensive endpoints, per entreprise_nom:
+# - token bucket: each tenant gets ADMISSION_RATE cost units per second, bursts up to ADMISSION_BURST
+# - weighted fair queue: at most ADMISSION_CAPACITY cost units run at once (all tenants);
+#   above that, requests queue and tenants are served in turn, in proportion of the cost
+#   they consume (a tenant importing catalogs doesn't delay the chat of the others)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "1"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "20"))
+ADMISSION_CAPACITY = float(os.getenv("ADMISSION_CAPACITY", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "10")) # Waiting requests per tenant
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+
+def _parse_costs(value: str) -> Dict[str, float]:
+    costs = {}
+    for part in value.split(","):
+        if "=" in part:
+            kind, cost = part.split("=", 1)
+            costs[kind.strip()] = float(cost)
+    return costs
+
+
+# Cost units per endpoint kind, e.g. "chat=1,pdf=1,price_list=5" (1 when not listed)
+ADMISSION_COSTS = _parse_costs(os.getenv("ADMISSION_COSTS", "chat=1,pdf=1,price_list=5"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _Bucket:
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.updated = time.monotonic()
+
+
+class _Waiter:
+    def __init__(self, finish: float, cost: float, kind: str):
+        self.finish = finish # Virtual finish tag: served by increasing tag
+        self.cost = cost
+        self.kind = kind
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionController:
+    """
+    Token buckets + start-time fair queuing. Not thread-safe: used from the event
+    loop only. Per process: with N workers, the limits apply N times.
+    """
+
+    def __init__(self, rate: float, burst: float, capacity: float, max_queue: int, queue_timeout: float):
+        self.rate = rate
+        self.burst = burst
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # An idle bucket is full again after burst / rate seconds: no need to keep it
+        self._buckets = TTLCache(maxsize=10000, ttl=burst / rate if rate > 0 else 3600)
+        self._queues: Dict[str, deque] = {}
+        self._last_finish: Dict[str, float] = {}
+        self._vtime = 0.0
+        self._in_use = 0.0
+        self._queued = 0
+
+    def _take(self, tenant: str, cost: float) -> Optional[float]:
+        """Spends `cost` tokens of the tenant; else returns the seconds until it could."""
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        bucket = self._buckets.get(tenant) or _Bucket(self.burst)
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        self._buckets.set(tenant, bucket)
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return None
+        return (cost - bucket.tokens) / self.rate if self.rate > 0 else 60
+
+    async def _acquire(self, tenant: str, kind: str, cost: float):
+        cost = min(cost, self.capacity) # A single request bigger than the capacity runs alone
+        if not self._queued and self._in_use + cost <= self.capacity:
+            self._in_use += cost
+            ADMISSION_IN_USE.set(self._in_use)
+            return
+
+        queue = self._queues.setdefault(tenant, deque())
+        if len(queue) >= self.max_queue:
+            ADMISSION_REJECTIONS.labels(kind, "queue_full").inc()
+            raise AdmissionRejected("Trop de requêtes en attente pour cette entreprise", self.queue_timeout)
+        finish = max(self._vtime, self._last_finish.get(tenant, 0.0)) + cost
+        self._last_finish[tenant] = finish
+        waiter = _Waiter(finish, cost, kind)
+        queue.append(waiter)
+        self._queued += 1
+        ADMISSION_QUEUE_DEPTH.labels(kind).inc()
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(cost) # Admitted just as the wait was given up
+            else:
+                self._forget(tenant, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_REJECTIONS.labels(kind, "queue_timeout").inc()
+                raise AdmissionRejected("Serveur saturé, réessayez dans un instant", self.queue_timeout / 2)
+            raise
+        finally:
+            ADMISSION_WAIT_SECONDS.labels(kind).observe(time.monotonic() - started)
+
+    def _forget(self, tenant: str, waiter: _Waiter):
+        queue = self._queues.get(tenant)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            ADMISSION_QUEUE_DEPTH.labels(waiter.kind).dec()
+            if not queue:
+                del self._queues[tenant]
+                self._last_finish.pop(tenant, None)
+
+    def _release(self, cost: float):
+        self._in_use -= cost
+        # Serve the waiting heads by increasing finish tag while they fit
+        while self._queues:
+            tenant, queue = min(self._queues.items(), key=lambda item: item[1][0].finish)
+            waiter = queue[0]
+            if waiter.future.done():
+                self._forget(tenant, waiter) # Gave up (timeout, disconnect), not yet removed
+                continue
+            if self._in_use + waiter.cost > self.capacity:
+                break
+            self._forget(tenant, waiter)
+            self._vtime = waiter.finish - waiter.cost
+            self._in_use += waiter.cost
+            waiter.future.set_result(None)
+        ADMISSION_IN_USE.set(self._in_use)
+
+    @asynccontextmanager
+    async def admit(self, tenant: Optional[str], kind: str):
+        """Raises AdmissionRejected (-> 429 + Retry-After) when over the limits."""
+        if not ADMISSION_ENABLED:
+            yield
+            return
+        tenant = tenant or "-"
+        cost = ADMISSION_COSTS.get(kind, 1.0)
+        retry_after = self._take(tenant, cost)
+        if retry_after is not None:
+            ADMISSION_REJECTIONS.labels(kind, "rate_limit").inc()
+            logger.info("Request rate limited", extra={"entreprise_nom": tenant, "kind": kind})
+            raise AdmissionRejected("Trop de requêtes pour cette entreprise, réessayez plus tard", retry_after)
+        await self._acquire(tenant, kind, cost)
+        try:
+            yield
+        finally:
+            self._release(min(cost, self.capacity))
+
+
+admission = AdmissionController(ADMISSION_RATE, ADMISSION_BURST, ADMISSION_CAPACITY, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+admit = admission.admit
@@ -0,0 +1,82 @@
+import csv
+import io
+import os
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, BinaryIO
+
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select
+
+from ..db.database import async_session
+from ..models.pricelist import PriceItem
+
+# Rows fetched per round trip (server-side cursor on PostgreSQL): memory doesn't grow with the catalog
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+# XLSX files are built before sending: in memory up to this size, then on disk
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(8 * 1024 * 1024)))
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+EXPORT_COLUMNS = ("label", "price_ht", "unit", "tva", "category")
+EXPORT_HEADER = ("Désignation", "Prix HT", "Unité", "TVA", "Catégorie")
+
+
+async def _batches(entreprise_id: int) -> AsyncIterator[list]:
+    # Own session: the request one is closed while the response is still streaming
+    statement = (
+        select(*(getattr(PriceItem, c) for c in EXPORT_COLUMNS))
+        .where(PriceItem.entreprise_id == entreprise_id)
+        .order_by(PriceItem.id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    async with async_session() as session:
+        result = await session.stream(statement)
+        async for rows in result.partitions():
+            yield rows
+
+
+async def stream_csv(entreprise_id: int) -> AsyncIterator[bytes]:
+    """CSV by batches of rows: the first bytes leave before the catalog is read."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM: Excel opens the file as UTF-8 (accents)
+    buffer.write("﻿")
+    writer.writerow(EXPORT_HEADER)
+    yield buffer.getvalue().encode("utf-8")
+    async for rows in _batches(entreprise_id):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def build_xlsx(entreprise_id: int) -> BinaryIO:
+    """
+    XLSX (a zip: only complete once the sheet is written) in a spooled file, rewound.
+    openpyxl write-only mode writes the rows out as they come: memory stays flat.
+    """
+    from openpyxl import Workbook # Heavy import: only loaded by the first export
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Catalogue")
+    sheet.append(EXPORT_HEADER)
+
+    def append(rows):
+        for row in rows:
+            sheet.append(tuple(row))
+
+    async for rows in _batches(entreprise_id):
+        # Blocking XML writes -> threadpool, one hop per batch
+        await run_in_threadpool(append, rows)
+
+    output = SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    await run_in_threadpool(workbook.save, output)
+    output.seek(0)
+    return output
+
+
+async def iter_file(file: BinaryIO) -> AsyncIterator[bytes]:
+    try:
+        while chunk := await run_in_threadpool(file.read, EXPORT_CHUNK_BYTES):
+            yield chunk
+    finally:
+        file.close()
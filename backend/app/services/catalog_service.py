@@ -0,0 +1,70 @@
+import hashlib
+import os
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.pricelist import CatalogVersion, PriceItem
+from .cache import TTLCache
+from .entreprise_cache import get_entreprise_by_nom
+
+# Catalog snapshots (per process), keyed by (entreprise_id, version): a snapshot never
+# changes, a write bumps the version in the DB, so every worker sees it at the next read.
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "64"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "3600")) # Only frees idle catalogs
+
+_snapshots = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+
+async def bump_catalog_version(session: AsyncSession, entreprise_ids: Iterable[Optional[int]]):
+    """
+    To call in the same transaction as every PriceItem write: the new version is
+    visible with the new items (a rollback gives it back).
+    """
+    insert = pg_insert if session.bind.dialect.name == "postgresql" else sqlite_insert
+    for entreprise_id in {i for i in entreprise_ids if i is not None}:
+        statement = insert(CatalogVersion).values(entreprise_id=entreprise_id, version=1)
+        statement = statement.on_conflict_do_update(
+            index_elements=["entreprise_id"],
+            set_={"version": CatalogVersion.version + 1}
+        )
+        await session.execute(statement)
+
+
+async def get_catalog_version(session: AsyncSession, entreprise_id: int) -> int:
+    row = await session.get(CatalogVersion, entreprise_id, populate_existing=True)
+    return row.version if row else 0
+
+
+def catalog_etag(entreprise_id: int, version: int, *filters: Optional[str]) -> str:
+    """ETag of a /pricelist response: the catalog version and the query filters."""
+    key = hashlib.sha1("\0".join(f or "" for f in filters).encode("utf-8")).hexdigest()[:8]
+    return f'"{entreprise_id}-{version}-{key}"'
+
+
+async def get_catalog(session: AsyncSession, entreprise_id: int) -> Tuple[int, Tuple[dict, ...]]:
+    """
+    (version, items) of the enterprise, items as PriceItem dicts in id order:
+    one primary key lookup when the snapshot is cached. Shared: don't mutate.
+    """
+    version = await get_catalog_version(session, entreprise_id)
+    cached = _snapshots.get((entreprise_id, version))
+    if cached is not None:
+        return version, cached
+    rows = (await session.exec(select(PriceItem).where(PriceItem.entreprise_id == entreprise_id).order_by(PriceItem.id))).all()
+    # Plain dicts: not bound to (or expired by) a session, read as is by the LLM context
+    items = tuple(row.model_dump() for row in rows)
+    _snapshots.set((entreprise_id, version), items)
+    return version, items
+
+
+async def catalog_for_llm(session: AsyncSession, entreprise_nom: Optional[str]) -> Optional[Tuple[dict, ...]]:
+    """Catalog of the enterprise for a chat turn (None: unknown enterprise)."""
+    ent = await get_entreprise_by_nom(session, entreprise_nom)
+    if not ent:
+        return None
+    _, items = await get_catalog(session, ent.id)
+    return items
@@ -0,0 +1,117 @@
+import asyncio
+from typing import List, Optional
+
+from fastapi import BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.devis import Devis, Ligne
+from ..models.llm import LLMQuoteResponse
+from .admission import admit
+from .catalog_service import catalog_for_llm
+from .conversation_service import append_turn, load_history, refresh_summary
+from .llm_service import propose_quote_update
+from .timing import span
+from .usage_service import choose_model, record_usage
+
+_background = set() # Summary tasks of the WebSocket sessions (kept referenced until done)
+
+
+class TurnResult:
+    def __init__(self, llm_response: LLMQuoteResponse, lines: Optional[List[Ligne]], entreprise_nom: Optional[str], summary_due: bool):
+        self.llm_response = llm_response
+        self.lines = lines # New full list of lines (update_quote), None when the quote is unchanged
+        self.entreprise_nom = entreprise_nom
+        self.summary_due = summary_due
+
+
+def entreprise_of(devis: Devis) -> Optional[str]:
+    # Old quotes have no entreprise_nom: fall back on the client's one
+    return devis.entreprise_nom or (devis.client.entreprise_nom if devis.client else None)
+
+
+def chips_for(devis: Devis) -> List[str]:
+    return ["Voir PDF", "Modifier"] if devis.lignes else []
+
+
+async def run_turn(
+    session: AsyncSession,
+    devis: Devis,
+    message: str,
+    include_detailed_description: bool = False,
+    image_base64: Optional[str] = None
+) -> TurnResult:
+    """
+    LLM part of a chat turn, shared by POST /chat/turn and the WebSocket sessions:
+    budget, conversation memory, admission, LLM call, then token usage and
+    conversation log added to `session` (committed by the caller).
+    The catalog is the server snapshot of the entreprise (clients no longer send it).
+    `devis` is only read: the caller applies `lines` (DB or in-memory session).
+    Raises BudgetExceeded / AdmissionRejected.
+    """
+    entreprise_nom = entreprise_of(devis)
+    # Token budget of the entreprise (checked before paying for the call).
+    # None: the model is routed per turn by the LLM service
+    model = await choose_model(session, entreprise_nom)
+
+    # Conversation memory: rolling summary + last messages (constant size)
+    summary, history, summary_due = await load_history(session, devis.id)
+    # Cached per catalog version: one primary key lookup per turn
+    price_list = await catalog_for_llm(session, entreprise_nom)
+
+    # End the read transaction: the pooled connection goes back to the pool while the
+    # turn waits in the admission queue and on the LLM (up to a minute), the writes
+    # below run in a new one. expire_on_commit=False keeps `devis` and its lines loaded
+    await session.commit()
+
+    # Blocking HTTP call -> threadpool, keeps the event loop free.
+    # Per-entreprise rate limit + fair queue (AdmissionRejected -> 429 with Retry-After)
+    async with admit(entreprise_nom, "chat"):
+        with span("llm"):
+            llm_response, llm_calls = await run_in_threadpool(
+                propose_quote_update,
+                message_user=message,
+                devis=devis,
+                include_detailed_description=include_detailed_description,
+                price_list=price_list,
+                image_base64=image_base64,
+                model=model,
+                summary=summary,
+                history=history
+            )
+    if entreprise_nom:
+        # One entry per call: escalations cost twice
+        for call_model, usage in llm_calls:
+            await record_usage(session, entreprise_nom, call_model, usage, devis_id=devis.id)
+    append_turn(session, devis.id, message + (" [photo jointe]" if image_base64 else ""), llm_response.assistant_message)
+
+    lines = None
+    if llm_response.action == "update_quote":
+        # Strategy: Replace ALL lines to avoid duplication/state issues.
+        # The LLM is instructed to return the full state.
+        lines = [
+            Ligne(
+                designation=l.label,
+                qte=l.quantity,
+                unite=l.unit,
+                pu_ht=l.unit_price_ht,
+                tva=l.tva_rate,
+                lot=l.lot,
+                note=l.note,
+                devis_id=devis.id
+            )
+            for l in llm_response.lines
+        ]
+    return TurnResult(llm_response, lines, entreprise_nom, summary_due)
+
+
+def schedule_summary(result: TurnResult, devis_id: str, background_tasks: Optional[BackgroundTasks] = None):
+    """Summary refresh after the turn: request background task, or a loop task (WebSocket)."""
+    if not result.summary_due:
+        return
+    if background_tasks is not None:
+        background_tasks.add_task(refresh_summary, devis_id, result.entreprise_nom)
+        return
+    task = asyncio.create_task(refresh_summary(devis_id, result.entreprise_nom))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
@@ -0,0 +1,97 @@
+import logging
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..db.database import async_session
+from ..models.conversation import ConversationMessage, ConversationSummary
+from .llm_service import summarize_conversation
+from .usage_service import record_usage
+
+logger = logging.getLogger(__name__)
+
+# Last messages (user + assistant) sent verbatim with each turn
+CONVERSATION_WINDOW_MESSAGES = int(os.getenv("CONVERSATION_WINDOW_MESSAGES", "6"))
+# Messages that left the window are folded into the summary by batches of at least this size
+CONVERSATION_SUMMARY_EVERY = int(os.getenv("CONVERSATION_SUMMARY_EVERY", "8"))
+# Stored messages are capped: the window costs at most WINDOW x MAX_CHARS characters
+CONVERSATION_MAX_MESSAGE_CHARS = int(os.getenv("CONVERSATION_MAX_MESSAGE_CHARS", "600"))
+
+_refreshing = set() # Devis being summarized by this process
+
+
+def _cap(text: str) -> str:
+    text = (text or "").strip()
+    if len(text) > CONVERSATION_MAX_MESSAGE_CHARS:
+        text = text[:CONVERSATION_MAX_MESSAGE_CHARS - 1] + "…"
+    return text
+
+
+async def load_history(session: AsyncSession, devis_id: str) -> Tuple[Optional[str], List[Tuple[str, str]], bool]:
+    """
+    (summary, window, summary_due) for the next turn of a devis, in 2 queries:
+    the rolling summary, the last messages as (role, content) oldest first, and
+    whether the messages out of the window are worth a summary refresh once this
+    turn (2 more messages) is stored.
+    """
+    summary = await session.get(ConversationSummary, devis_id)
+    statement = (
+        select(ConversationMessage)
+        .where(ConversationMessage.devis_id == devis_id, ConversationMessage.id > (summary.summarized_until if summary else 0))
+        .order_by(ConversationMessage.id.desc())
+        .limit(CONVERSATION_WINDOW_MESSAGES + CONVERSATION_SUMMARY_EVERY)
+    )
+    pending = (await session.exec(statement)).all()
+    window = [(m.role, m.content) for m in reversed(pending[:CONVERSATION_WINDOW_MESSAGES])]
+    summary_due = len(pending) + 2 >= CONVERSATION_WINDOW_MESSAGES + CONVERSATION_SUMMARY_EVERY
+    return (summary.summary if summary else None) or None, window, summary_due
+
+
+def append_turn(session: AsyncSession, devis_id: str, user_message: str, assistant_message: str):
+    """Adds the turn to the log. Committed by the caller (with the quote changes)."""
+    session.add_all([
+        ConversationMessage(devis_id=devis_id, role="user", content=_cap(user_message)),
+        ConversationMessage(devis_id=devis_id, role="assistant", content=_cap(assistant_message)),
+    ])
+
+
+async def refresh_summary(devis_id: str, entreprise_nom: Optional[str] = None):
+    """
+    Background task (after the response is sent): folds the messages that left the
+    window into the summary. Only the previous summary and the new messages are sent,
+    so the cost doesn't grow with the conversation.
+    """
+    if devis_id in _refreshing:
+        return
+    _refreshing.add(devis_id)
+    try:
+        async with async_session() as session:
+            summary = await session.get(ConversationSummary, devis_id) or ConversationSummary(devis_id=devis_id)
+            statement = (
+                select(ConversationMessage)
+                .where(ConversationMessage.devis_id == devis_id, ConversationMessage.id > summary.summarized_until)
+                .order_by(ConversationMessage.id)
+            )
+            pending = (await session.exec(statement)).all()
+            to_fold = pending[:len(pending) - CONVERSATION_WINDOW_MESSAGES]
+            if len(to_fold) < CONVERSATION_SUMMARY_EVERY:
+                return
+
+            text, model, usage = await run_in_threadpool(summarize_conversation, summary.summary, [(m.role, m.content) for m in to_fold])
+            if usage is not None and entreprise_nom:
+                await record_usage(session, entreprise_nom, model, usage, devis_id=devis_id)
+            if text is not None:
+                summary.summary = text
+                summary.summarized_until = to_fold[-1].id
+                summary.updated_at = datetime.now(timezone.utc)
+                session.add(summary)
+            await session.commit()
+            logger.info("Conversation summary refreshed", extra={"devis_id": devis_id, "folded": len(to_fold), "ok": text is not None})
+    except Exception:
+        logger.exception("Conversation summary refresh failed", extra={"devis_id": devis_id})
+    finally:
+        _refreshing.discard(devis_id)
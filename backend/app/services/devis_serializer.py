@@ -0,0 +1,73 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi.responses import Response
+
+from ..models.chat import ClientPublic, DevisMeta, DevisPayload, LignePublic
+from ..models.client import Client
+from ..models.devis import Devis
+
+# Field layout computed once from the response models (not per request / per line)
+_NESTED = {"lignes", "totaux", "meta", "client"}
+_DEVIS_FIELDS: Tuple[str, ...] = tuple(f for f in DevisPayload.model_fields if f not in _NESTED)
+_LIGNE_FIELDS: Tuple[str, ...] = tuple(LignePublic.model_fields)
+_CLIENT_FIELDS: Tuple[str, ...] = tuple(ClientPublic.model_fields)
+_META_FIELDS: Tuple[str, ...] = tuple(f for f in DevisMeta.model_fields if f != "devis_id")
+# Lines in WebSocket patches: ids are DB-internal (assigned by the write-behind flush)
+_PATCH_LIGNE_FIELDS: Tuple[str, ...] = tuple(f for f in _LIGNE_FIELDS if f not in ("id", "devis_id"))
+
+
+def _fields(obj, fields: Tuple[str, ...]) -> Dict[str, Any]:
+    # Loaded column values are read straight from the instance dict (no descriptor, no
+    # pydantic dump); getattr only for values not loaded/defaulted yet.
+    values = obj.__dict__
+    return {f: values[f] if f in values else getattr(obj, f) for f in fields}
+
+
+def devis_payload(devis: Devis, totaux: Dict[str, Any], client: Optional[Client] = None) -> Dict[str, Any]:
+    """Devis + lignes + totaux + meta (+ client), as described by DevisPayload."""
+    payload = _fields(devis, _DEVIS_FIELDS)
+    payload["lignes"] = [_fields(l, _LIGNE_FIELDS) for l in devis.lignes]
+    payload["totaux"] = totaux
+    meta = {"devis_id": devis.id}
+    for f in _META_FIELDS:
+        meta[f] = payload[f]
+    payload["meta"] = meta
+    if client is not None:
+        payload["client"] = _fields(client, _CLIENT_FIELDS)
+    return payload
+
+
+def ligne_rows(lignes) -> List[Dict[str, Any]]:
+    return [_fields(l, _PATCH_LIGNE_FIELDS) for l in lignes]
+
+
+def lines_patch(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Positional operations turning `old` rows into `new` ones (see ligne_rows):
+    {"op": "set", "index": i, "line": {...}} (replace or append at i == length),
+    then {"op": "truncate", "length": n} when lines were removed.
+    """
+    ops = [{"op": "set", "index": i, "line": row} for i, row in enumerate(new) if i >= len(old) or old[i] != row]
+    if len(new) < len(old):
+        ops.append({"op": "truncate", "length": len(new)})
+    return ops
+
+
+class FastJSONResponse(Response):
+    """orjson encoding (dates, floats, nested dicts) without FastAPI's jsonable_encoder pass."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def chat_response(session_id: str, assistant_message: str, chips: List[str], devis: Devis, totaux: Dict[str, Any], client: Optional[Client] = None) -> FastJSONResponse:
+    # Same shape as ChatResponse (declared as response_model for the docs)
+    return FastJSONResponse({
+        "session_id": session_id,
+        "assistant_message": assistant_message,
+        "chips": chips,
+        "devis_id": devis.id,
+        "devis": devis_payload(devis, totaux, client),
+    })
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import random
+from datetime import timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import update
+from sqlmodel import select
+
+from ..db.database import async_session
+from ..models.email import EmailOutbox, EmailAttachment, utcnow
+from .email_service import build_params, get_email_provider
+
+logger = logging.getLogger(__name__)
+
+# Delivery tuning
+EMAIL_WORKER_CONCURRENCY = int(os.getenv("EMAIL_WORKER_CONCURRENCY", "4"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "5"))
+EMAIL_SEND_POLL_SECONDS = 0.25 # /send re-reads the rows it waits for at this pace
+EMAIL_LEASE_SECONDS = 300 # A "sending" row older than this is retried (worker died mid-send)
+EMAIL_BATCH_SIZE = 50
+
+_wakeup: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+# email id -> future resolved after its next delivery attempt (see wait_for_delivery)
+_waiters: Dict[str, asyncio.Future] = {}
+
+
+def _backoff(attempts: int) -> float:
+    # Exponential backoff with jitter: 30s, 1min, 2min, 4min... capped
+    delay = min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _due(now):
+    return (EmailOutbox.status.in_(("pending", "sending"))) & (EmailOutbox.next_attempt_at <= now)
+
+
+async def _deliver(email_id: str, semaphore: asyncio.Semaphore):
+    async with semaphore, async_session() as session:
+        now = utcnow()
+        # Claim: conditional UPDATE, only one worker (or process) wins the row
+        claimed = await session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id == email_id, _due(now))
+            .values(status="sending", attempts=EmailOutbox.attempts + 1, next_attempt_at=now + timedelta(seconds=EMAIL_LEASE_SECONDS))
+        )
+        await session.commit()
+        if claimed.rowcount != 1:
+            return
+
+        email = await session.get(EmailOutbox, email_id)
+        attachment = await session.get(EmailAttachment, email.attachment_id) if email.attachment_id else None
+        try:
+            provider_id = await get_email_provider().send(build_params(email, attachment))
+        except Exception as e:
+            email.last_error = str(e)[:500]
+            if email.attempts >= EMAIL_MAX_ATTEMPTS:
+                email.status = "dead" # Dead letter: kept for inspection, never retried
+            else:
+                email.status = "pending"
+                email.next_attempt_at = utcnow() + timedelta(seconds=_backoff(email.attempts))
+            logger.warning("Email delivery failed: %s", e, extra={"email_id": email.id, "attempts": email.attempts, "status": email.status})
+        else:
+            email.status = "sent"
+            email.sent_at = utcnow()
+            email.provider_id = provider_id
+            email.last_error = None
+        session.add(email)
+        await session.commit()
+
+        waiter = _waiters.pop(email.id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(email.status)
+
+
+async def drain_outbox() -> int:
+    """Delivers the due emails once, concurrently (bounded). Returns how many were picked."""
+    async with async_session() as session:
+        statement = select(EmailOutbox.id).where(_due(utcnow())).order_by(EmailOutbox.next_attempt_at).limit(EMAIL_BATCH_SIZE)
+        ids = (await session.exec(statement)).all()
+    semaphore = asyncio.Semaphore(EMAIL_WORKER_CONCURRENCY)
+    await asyncio.gather(*[_deliver(email_id, semaphore) for email_id in ids])
+    return len(ids)
+
+
+async def _worker_loop():
+    while True:
+        _wakeup.clear()
+        try:
+            picked = await drain_outbox()
+        except Exception as e:
+            logger.exception("Email outbox worker error")
+            picked = 0
+        if picked >= EMAIL_BATCH_SIZE:
+            continue # Backlog: no pause
+        try:
+            await asyncio.wait_for(_wakeup.wait(), EMAIL_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def watch_delivery(email_ids: List[str]) -> List[asyncio.Future]:
+    """
+    Registers futures resolved after the first delivery attempt of each email.
+    To call BEFORE committing/waking the worker, so no outcome can be missed.
+    """
+    loop = asyncio.get_running_loop()
+    futures = []
+    for email_id in email_ids:
+        _waiters[email_id] = loop.create_future()
+        futures.append(_waiters[email_id])
+    return futures
+
+
+async def _attempted(email_ids: List[str]) -> List[str]:
+    async with async_session() as session:
+        statement = select(EmailOutbox.id).where(
+            EmailOutbox.id.in_(email_ids), EmailOutbox.attempts > 0, EmailOutbox.status != "sending"
+        )
+        return (await session.exec(statement)).all()
+
+
+async def wait_for_delivery(email_ids: List[str], futures: List[asyncio.Future], timeout: float):
+    """
+    Waits (bounded) for the first delivery attempts; late ones keep going in the background.
+    The futures only resolve for attempts made by this process' worker: the rows are
+    polled too, for emails claimed by another worker process (or EMAIL_OUTBOX_WORKER=0).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    waiting = dict(zip(email_ids, futures))
+    try:
+        while waiting:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.wait(waiting.values(), timeout=min(remaining, EMAIL_SEND_POLL_SECONDS))
+            waiting = {email_id: f for email_id, f in waiting.items() if not f.done()}
+            if waiting:
+                for email_id in await _attempted(list(waiting)):
+                    del waiting[email_id]
+    finally:
+        for email_id in email_ids:
+            _waiters.pop(email_id, None)
+
+
+def wake_outbox_worker():
+    """To call after committing new outbox rows: delivery starts right away."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def start_outbox_worker():
+    global _wakeup, _task
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_worker_loop())
+
+
+async def stop_outbox_worker():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -1,63 +1,118 @@
 import os
-import resend
+import base64
+import logging
 from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..models.email import EmailOutbox, EmailAttachment
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 RESEND_API_KEY = os.getenv("RESEND_API_KEY")
 FROM_EMAIL = "contact@devis.ai"  # Or the verified sender in Resend
 ADMIN_EMAIL = "contact@devis.ai" # Where to send the feedback
 
-if RESEND_API_KEY:
-    resend.api_key = RESEND_API_KEY
+# "resend" (real delivery) or "fake" (offline, messages are only recorded)
+EMAIL_PROVIDER = os.getenv("EMAIL_PROVIDER") or ("resend" if RESEND_API_KEY else "fake")
+
+
+
+class ResendProvider:
+    name = "resend"
+
+    def __init__(self):
+        # Imported on first use: the SDK is slow to import and unused with the fake provider
+        import resend
+        resend.api_key = RESEND_API_KEY
+        self.resend = resend
+
+    async def send(self, params: dict) -> Optional[str]:
+        # The Resend SDK is synchronous: keep it off the event loop
+        r = await run_in_threadpool(self.resend.Emails.send, params)
+        return r.get("id") if isinstance(r, dict) else None
+
+
+class FakeProvider:
+    """Offline provider for local dev and tests: records messages instead of sending them."""
+    name = "fake"
+
+    def __init__(self):
+        self.sent: List[dict] = []
+        self.fail_next = 0 # Number of upcoming sends that will raise (to exercise retries)
+
+    async def send(self, params: dict) -> Optional[str]:
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise RuntimeError("Fake provider failure")
+        self.sent.append(params)
+        logger.info("Fake email sent", extra={"to": params["to"], "subject": params["subject"], "attachments": len(params.get("attachments", []))})
+        return f"fake-{len(self.sent)}"
+
+
+_provider = None
+
+def get_email_provider():
+    global _provider
+    if _provider is None:
+        _provider = ResendProvider() if EMAIL_PROVIDER == "resend" else FakeProvider()
+    return _provider
+
+
+def encode_attachment(filename: str, content: bytes) -> dict:
+    """
+    Resend accepts the content as a base64 string: one compact buffer (~1.33x the file)
+    that serializes to JSON as-is, instead of list(bytes) (one int object per byte,
+    ~4 chars of JSON per byte).
+    """
+    return {
+        "filename": filename,
+        "content": base64.b64encode(content).decode("ascii"),
+    }
+
+
+def build_params(email: EmailOutbox, attachment: Optional[EmailAttachment] = None) -> dict:
+    """Provider payload (Resend format) for one outbox email."""
+    params = {
+        "from": "Devis.ai <onboarding@resend.dev>",
+        "to": [email.to_email],
+        "subject": email.subject,
+        "html": email.html,
+    }
+    if email.reply_to:
+        params["reply_to"] = email.reply_to
+    if attachment:
+        params["attachments"] = [encode_attachment(attachment.filename, attachment.data)]
+    return params
+
 
 class EmailService:
+    """
+    Emails are never sent inline: they are written to the outbox in the caller's
+    transaction (no commit here) and delivered by the outbox worker (email_outbox.py).
+    """
+
     @staticmethod
-    def send_email(to_email: str, subject: str, html_content: str, reply_to: Optional[str] = None, attachments: Optional[list] = None):
-        if not RESEND_API_KEY:
-            print(f"=== [MOCK EMAIL] To: {to_email} | Subject: {subject} | Attachments: {len(attachments) if attachments else 0} ===")
-            return True
-
-        try:
-            params = {
-                "from": "Devis.ai <onboarding@resend.dev>",
-                "to": [to_email],
-                "subject": subject,
-                "html": html_content,
-            }
-            if reply_to:
-                params["reply_to"] = reply_to
-            
-            if attachments:
-                # Convert to Resend format if needed
-                # Resend expects: {"filename": "foo.pdf", "content": [bytes...]}
-                formatted_attachments = []
-                for att in attachments:
-                    # Handle dict from devis.py: {'file': bytes, 'filename': str, ...}
-                    if isinstance(att, dict) and 'file' in att and 'filename' in att:
-                        # Convert bytes to list of integers for JSON serialization if required by SDK, 
-                        # OR if SDK handles bytes directly. safely assuming list(bytes) works for JSON APIs.
-                        content = att['file']
-                        if isinstance(content, bytes):
-                            content = list(content)
-                        formatted_attachments.append({
-                            "filename": att['filename'],
-                            "content": content
-                        })
-                    # Handle already formatted
-                    elif isinstance(att, dict) and 'content' in att:
-                         formatted_attachments.append(att)
-                
-                if formatted_attachments:
-                    params["attachments"] = formatted_attachments
-
-            r = resend.Emails.send(params)
-            return r
-        except Exception as e:
-            print(f"Resend Error: {e}")
-            raise e
+    def queue_attachment(session: AsyncSession, filename: str, content: bytes, content_type: str = "application/octet-stream") -> EmailAttachment:
+        attachment = EmailAttachment(filename=filename, content_type=content_type, data=content)
+        session.add(attachment)
+        return attachment
 
     @staticmethod
-    def send_idea_feedback(category: str, message: str, user_email: Optional[str] = None):
+    def queue_email(session: AsyncSession, to_email: str, subject: str, html_content: str, reply_to: Optional[str] = None, attachment_id: Optional[str] = None, recipient_type: str = "to") -> EmailOutbox:
+        email = EmailOutbox(
+            to_email=to_email,
+            recipient_type=recipient_type,
+            subject=subject,
+            html=html_content,
+            reply_to=reply_to,
+            attachment_id=attachment_id,
+        )
+        session.add(email)
+        return email
+
+    @staticmethod
+    def queue_idea_feedback(session: AsyncSession, category: str, message: str, user_email: Optional[str] = None) -> EmailOutbox:
         subject = f"💡 Nouveau Feedback: {category}"
         html_content = f"""
         <h2>Nouveau Feedback Reçu</h2>
@@ -68,10 +123,10 @@ class EmailService:
         </blockquote>
         <p><strong>Envoyé par:</strong> {user_email if user_email else "Anonyme"}</p>
         """
-        return EmailService.send_email(ADMIN_EMAIL, subject, html_content, reply_to=user_email)
+        return EmailService.queue_email(session, ADMIN_EMAIL, subject, html_content, reply_to=user_email)
 
     @staticmethod
-    def send_quality_audit(score: int, details: dict, user_email: Optional[str] = None):
+    def queue_quality_audit(session: AsyncSession, score: int, details: dict, user_email: Optional[str] = None) -> EmailOutbox:
         subject = f"✅ Audit Qualité - Score: {score}/100"
         details_html = "<ul>"
         for k, v in details.items():
@@ -84,34 +139,4 @@ class EmailService:
         {details_html}
         <p><strong>Utilisateur:</strong> {user_email if user_email else "Non renseigné"}</p>
         """
-        return EmailService.send_email(ADMIN_EMAIL, subject, html_content, reply_to=user_email)
-
-# Async wrapper for compatibility with older code (devis.py)
-async def send_email(recipients: List[str], subject: str, body: str, attachments: List = None):
-    # Adapter function
-    # body is passed as html_content
-    # recipients is a list, but we take the first one or iterate? 
-    # Resend 'to' can be a list of strings, so we pass it directly if we change signature, 
-    # but EmailService.send_email takes single string 'to_email' currently? 
-    # Let's check send_email signature above: def send_email(to_email: str, ...)
-    # I should update EmailService.send_email to accept list or handle it here.
-    
-    # Simple fix: Iterate or join? Resend 'to' parameter IS a list of strings.
-    # So actually my EmailService.send_email should take List[str] or I wrap it.
-    
-    # Hack for now: Take first recipient or join comma separated (Resend wants list of strings)
-    # But EmailService.send_email line: "to": [to_email] implies single string input.
-    # Let's adjust this wrapper to call it for each, or better: adjust EmailService to take list, 
-    # BUT I defined it as str above.
-    
-    # Wait, previous step I defined: "to": [to_email]. 
-    # If I pass a LIST to to_email, it becomes "to": [[...]] which is wrong.
-    
-    # I will support multiple recipients in the wrapper by calling it once per recipient OR 
-    # better: just support the first one since abuse usually sends to one.
-    
-    to = recipients[0] if recipients else ADMIN_EMAIL # Fallback
-    
-    # We can pass attachments through
-    return EmailService.send_email(to, subject, body, attachments=attachments)
-
+        return EmailService.queue_email(session, ADMIN_EMAIL, subject, html_content, reply_to=user_email)
@@ -0,0 +1,42 @@
+import os
+from typing import Optional
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.entreprise import Entreprise
+from .cache import TTLCache
+
+# Tenant resolution cache (per process). The TTL bounds staleness across workers,
+# writes going through this process invalidate immediately.
+ENTREPRISE_CACHE_TTL = float(os.getenv("ENTREPRISE_CACHE_TTL", "60"))
+ENTREPRISE_CACHE_SIZE = int(os.getenv("ENTREPRISE_CACHE_SIZE", "512"))
+
+_cache = TTLCache(maxsize=ENTREPRISE_CACHE_SIZE, ttl=ENTREPRISE_CACHE_TTL)
+
+
+def _remember(ent: Entreprise) -> Entreprise:
+    # Detached copy: the cached record must not be bound to (or expired by) a session
+    snapshot = Entreprise.model_validate(ent)
+    _cache.set(snapshot.nom, snapshot)
+    return snapshot
+
+
+async def get_entreprise_by_nom(session: AsyncSession, nom: str) -> Optional[Entreprise]:
+    """
+    Retourne l'entreprise (copie en lecture seule) depuis le cache ou la base.
+    Pour la modifier, recharger l'objet avec session.get().
+    """
+    if not nom:
+        return None
+    cached = _cache.get(nom)
+    if cached is not None:
+        return cached
+    ent = (await session.exec(select(Entreprise).where(Entreprise.nom == nom))).first()
+    return _remember(ent) if ent else None
+
+
+def invalidate_entreprise(*noms: Optional[str]) -> None:
+    """Write-through invalidation: to call after every Entreprise write (old and new name on a rename)."""
+    for nom in noms:
+        if nom:
+            _cache.pop(nom)
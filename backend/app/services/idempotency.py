@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Retried POSTs (flaky mobile networks) carrying the same Idempotency-Key get the
+# original response instead of a second LLM call / email. In-process store: with
+# several workers, a retry landing on another process runs again.
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "1000"))
+# How long a duplicate waits for the original request still in flight (LLM turn + escalation)
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "150"))
+IDEMPOTENCY_MAX_KEY_CHARS = 255
+
+# POST routes whose side effects must not be repeated
+IDEMPOTENT_ROUTES = [
+    re.compile(r"^/chat/turn$"),
+    re.compile(r"^/devis/[^/]+/send$"),
+]
+
+
+class _Entry:
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = asyncio.Event()
+        self.response = None # (status, headers, body) once completed with a 2xx
+
+
+_store = TTLCache(maxsize=IDEMPOTENCY_MAX_KEYS, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+
+async def _error(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, response):
+    status, headers, body = response
+    await send({"type": "http.response.start", "status": status, "headers": headers + [(b"idempotent-replayed", b"true")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware for IDEMPOTENT_ROUTES: the first request with a given
+    Idempotency-Key runs, duplicates wait for it and get its response replayed.
+    Only 2xx responses are kept: after an error, a retry runs again.
+    A key reused with another path or body is refused (409).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not any(r.match(scope["path"]) for r in IDEMPOTENT_ROUTES):
+            return await self.app(scope, receive, send)
+        key = dict(scope["headers"]).get(b"idempotency-key", b"").decode("latin-1").strip()
+        if not key:
+            return await self.app(scope, receive, send)
+        if len(key) > IDEMPOTENCY_MAX_KEY_CHARS:
+            return await _error(send, 400, "Idempotency-Key trop longue")
+
+        # The body is part of the fingerprint: read it, then hand it back to the app
+        chunks, more_body = [], True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(scope["path"].encode() + b"\0" + body).hexdigest()
+
+        while (entry := _store.get(key)) is not None:
+            if entry.fingerprint != fingerprint:
+                return await _error(send, 409, "Idempotency-Key déjà utilisée pour une autre requête")
+            try:
+                await asyncio.wait_for(entry.done.wait(), IDEMPOTENCY_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                return await _error(send, 409, "Requête originale toujours en cours, réessayez plus tard")
+            if entry.response is not None:
+                logger.info("Idempotent replay", extra={"path": scope["path"]})
+                return await _replay(send, entry.response)
+            # The original failed and released the key: run it (unless another duplicate already does)
+
+        entry = _Entry(fingerprint)
+        _store.set(key, entry)
+
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        start, parts = None, []
+
+        async def send_and_record(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                parts.append(message.get("body", b""))
+                if not message.get("more_body", False) and 200 <= start["status"] < 300:
+                    entry.response = (start["status"], list(start.get("headers", [])), b"".join(parts))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_record)
+        finally:
+            if entry.response is None and _store.get(key) is entry:
+                _store.pop(key)
+            entry.done.set()
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+import orjson
+from sqlmodel import delete, update
+
+from ..db.database import async_session
+from ..db.repository import get_devis_full
+from ..models.devis import Devis, Ligne, LigneBase
+from .admission import AdmissionRejected
+from .calc_service import compute_totaux
+from .chat_service import TurnResult, chips_for, run_turn, schedule_summary
+from .devis_serializer import devis_payload, ligne_rows, lines_patch
+from .usage_service import BudgetExceeded
+
+logger = logging.getLogger(__name__)
+
+# WebSocket chat sessions (/ws/chat/{session_id}): the working devis stays in memory
+# while a user edits it, turns push patches (changed lines + totaux) instead of the
+# whole document, and the lines are written to the DB behind the turns (write-behind).
+# Per process: the WebSocket stays on the worker that holds its session.
+LIVE_FLUSH_DELAY_SECONDS = float(os.getenv("LIVE_FLUSH_DELAY_SECONDS", "2"))
+# Kept after the last disconnect, so that a reconnecting client resumes from its version
+LIVE_IDLE_SECONDS = float(os.getenv("LIVE_IDLE_SECONDS", "300"))
+# Patches kept for resume: a client further behind gets a snapshot
+LIVE_PATCH_LOG = int(os.getenv("LIVE_PATCH_LOG", "50"))
+
+_LIGNE_COLUMNS = tuple(LigneBase.model_fields)
+
+
+def dumps(message: dict) -> str:
+    return orjson.dumps(message).decode()
+
+
+class LiveSession:
+    def __init__(self, devis_id: str):
+        self.devis_id = devis_id
+        self.devis: Optional[Devis] = None # Loaded with its lines and client, detached from any DB session
+        self.totaux: dict = {}
+        # Versions are only comparable within an epoch (a new LiveSession starts a new one)
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.log: deque = deque(maxlen=LIVE_PATCH_LOG)
+        self.sockets = set()
+        self.turn_ids: deque = deque(maxlen=20) # Client turn ids already handled (resent after a reconnect)
+        self.turn_lock = asyncio.Lock()
+        self.flush_lock = asyncio.Lock()
+        self.dirty_version = 0 # Last version that changed the quote
+        self.persisted_version = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._expire_task: Optional[asyncio.Task] = None
+
+    async def load(self):
+        """Devis + lines + client from the DB (2 queries). Raises LookupError if it doesn't exist."""
+        async with async_session() as session:
+            devis = await get_devis_full(session, self.devis_id)
+        if devis is None:
+            raise LookupError(self.devis_id)
+        self.devis = devis
+        self.totaux = compute_totaux(devis)
+
+    def snapshot(self) -> dict:
+        return {"type": "snapshot", "epoch": self.epoch, "version": self.version, "devis": devis_payload(self.devis, self.totaux, self.devis.client)}
+
+    def resume(self, epoch: Optional[str], version: Optional[int]) -> List[dict]:
+        """Messages bringing a (re)connecting client up to date: missed patches, or a snapshot."""
+        if epoch == self.epoch and version is not None:
+            if version == self.version:
+                return [{"type": "ready", "epoch": self.epoch, "version": self.version}]
+            missed = [patch for patch in self.log if patch["version"] > version]
+            if missed and missed[0]["version"] == version + 1:
+                return missed
+        return [self.snapshot()]
+
+    async def broadcast(self, message: dict):
+        text = dumps(message)
+        for websocket in list(self.sockets):
+            try:
+                await websocket.send_text(text)
+            except Exception:
+                # Closed under us: the receive loop of this socket detaches it
+                self.sockets.discard(websocket)
+
+    def _apply(self, result: TurnResult) -> dict:
+        """Applies the turn to the in-memory devis and returns its patch."""
+        llm_response = result.llm_response
+        patch = {"type": "patch", "epoch": self.epoch, "version": self.version + 1, "assistant_message": llm_response.assistant_message}
+        if result.lines is not None:
+            old_rows = ligne_rows(self.devis.lignes)
+            self.devis.lignes = result.lines
+            self.totaux = compute_totaux(self.devis) # Also sets total_ht on the lines
+            patch["lines"] = lines_patch(old_rows, ligne_rows(self.devis.lignes))
+            patch["totaux"] = self.totaux
+            if llm_response.detailed_description:
+                self.devis.detailed_description = llm_response.detailed_description
+                patch["fields"] = {"detailed_description": llm_response.detailed_description}
+            self.dirty_version = patch["version"]
+        patch["chips"] = chips_for(self.devis)
+        self.version = patch["version"]
+        self.log.append(patch)
+        return patch
+
+    async def turn(self, websocket, message: str, include_detailed_description: bool = False, image_base64=None, turn_id: Optional[str] = None):
+        async with self.turn_lock:
+            # Checked under the lock: a resent turn waits for the original, then sees it.
+            # Already handled: its patch was delivered (or will be, by resume)
+            if turn_id and turn_id in self.turn_ids:
+                return
+            if self.devis is None:
+                await self.load()
+            async with async_session() as session:
+                try:
+                    result = await run_turn(session, self.devis, message, include_detailed_description, image_base64)
+                except BudgetExceeded:
+                    await websocket.send_text(dumps({"type": "error", "status": 429, "detail": "Budget IA journalier atteint pour cette entreprise", "turn_id": turn_id}))
+                    return
+                except AdmissionRejected as e:
+                    await websocket.send_text(dumps({"type": "error", "status": 429, "detail": e.detail, "retry_after": e.retry_after, "turn_id": turn_id}))
+                    return
+                # Token usage + conversation log now; the quote itself is written behind
+                await session.commit()
+            patch = self._apply(result)
+            patch["turn_id"] = turn_id
+            # Only once applied: after a 429 or an error, the client's retry runs again
+            if turn_id:
+                self.turn_ids.append(turn_id)
+            schedule_summary(result, self.devis_id)
+            if self.dirty_version > self.persisted_version:
+                self._schedule_flush()
+        await self.broadcast(patch)
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(LIVE_FLUSH_DELAY_SECONDS)
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Live session flush failed", extra={"devis_id": self.devis_id})
+
+    async def flush(self):
+        """Writes the in-memory lines (and detailed description) if they changed since the last write."""
+        async with self.flush_lock:
+            if self.devis is None or self.dirty_version <= self.persisted_version:
+                return
+            version = self.dirty_version
+            lignes = [Ligne(**{f: getattr(l, f) for f in _LIGNE_COLUMNS}, devis_id=self.devis_id) for l in self.devis.lignes]
+            async with async_session() as session:
+                await session.exec(delete(Ligne).where(Ligne.devis_id == self.devis_id))
+                session.add_all(lignes)
+                await session.exec(update(Devis).where(Devis.id == self.devis_id).values(detailed_description=self.devis.detailed_description))
+                await session.commit()
+            self.persisted_version = version
+            logger.debug("Live session flushed", extra={"devis_id": self.devis_id, "version": version, "lines": len(lignes)})
+
+    async def reload(self):
+        """The devis was changed outside the session (HTTP): reload it and push a snapshot."""
+        async with self.turn_lock:
+            await self.flush()
+            await self.load()
+            self.version += 1
+            self.log.clear() # Patches can't bridge an outside change
+        await self.broadcast(self.snapshot())
+
+    async def _expire(self):
+        # Nobody is editing: write now, keep the state a while for a resume.
+        # Shielded: a reconnection cancels this task, not a write in progress
+        try:
+            await asyncio.shield(self.flush())
+        except Exception:
+            logger.exception("Live session flush failed", extra={"devis_id": self.devis_id})
+        await asyncio.sleep(LIVE_IDLE_SECONDS)
+        if not self.sockets:
+            try:
+                await asyncio.shield(self.flush())
+            finally:
+                # A reconnection may have cancelled us during the flush: keep the session then
+                if not self.sockets and _sessions.get(self.devis_id) is self:
+                    del _sessions[self.devis_id]
+
+
+_sessions: Dict[str, LiveSession] = {}
+_creating: Dict[str, asyncio.Lock] = {}
+
+
+async def attach(devis_id: str, websocket) -> LiveSession:
+    """Live session of a devis (loaded on first connection). Raises LookupError if the devis doesn't exist."""
+    live = _sessions.get(devis_id)
+    if live is None:
+        # Two first connections at once load the devis once
+        lock = _creating.setdefault(devis_id, asyncio.Lock())
+        try:
+            async with lock:
+                live = _sessions.get(devis_id)
+                if live is None:
+                    live = LiveSession(devis_id)
+                    await live.load()
+                    _sessions[devis_id] = live
+        finally:
+            _creating.pop(devis_id, None)
+    if live._expire_task is not None:
+        live._expire_task.cancel()
+        live._expire_task = None
+    live.sockets.add(websocket)
+    return live
+
+
+def detach(live: LiveSession, websocket):
+    live.sockets.discard(websocket)
+    if not live.sockets and live._expire_task is None:
+        # A task, not awaited here: the handler of a closed socket may be cancelled
+        live._expire_task = asyncio.create_task(live._expire())
+
+
+async def flush(devis_id: str):
+    """Before reading the devis from the DB elsewhere (HTTP turn, PDF, email)."""
+    live = _sessions.get(devis_id)
+    if live is not None:
+        await live.flush()
+
+
+async def reload(devis_id: str):
+    """After the devis was changed in the DB elsewhere."""
+    live = _sessions.get(devis_id)
+    if live is not None:
+        await live.reload()
+
+
+async def flush_all():
+    """Shutdown: write every pending change."""
+    for live in list(_sessions.values()):
+        try:
+            await live.flush()
+        except Exception:
+            logger.exception("Live session flush failed", extra={"devis_id": live.devis_id})
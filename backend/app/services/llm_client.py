@@ -0,0 +1,66 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# One OpenAI client (and one HTTP connection pool) for every LLM call site.
+# LLM calls run in the threadpool (40 threads by default with anyio): the pool is
+# sized to match, so a burst never waits for a connection nor opens throwaway ones.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "40"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60")) # Default per-call read timeout (seconds)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# HTTP/2 needs the h2 package (pip install "httpx[http2]")
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "0") == "1"
+# Local stand-in / proxy (OpenAI-compatible API), e.g. http://localhost:8080/v1
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+_client = None
+_lock = threading.Lock()
+
+
+def llm_timeout(read: Optional[float] = None):
+    """Per-call timeout: `create(..., timeout=llm_timeout(120))` for long calls."""
+    import httpx
+    return httpx.Timeout(read or LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2 # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("LLM_HTTP2=1 but the h2 package is missing: using HTTP/1.1")
+        return False
+
+
+def get_llm_client():
+    """
+    Shared OpenAI client, built on first use (importing openai costs ~0.6s of cold start).
+    Thread-safe: first calls may come from several threadpool workers at once.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+                    ),
+                    timeout=llm_timeout(),
+                    http2=LLM_HTTP2 and _http2_available(),
+                )
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=OPENAI_BASE_URL,
+                    max_retries=LLM_MAX_RETRIES,
+                    http_client=http_client,
+                )
+    return _client
@@ -0,0 +1,162 @@
+import os
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    # Optional: exact counts for the OpenAI models (pip install tiktoken)
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens allowed for the quote lines + catalog of a turn (system prompt not included)
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "6000"))
+# Part of it for the catalog block of the (cacheable) prompt prefix
+LLM_CATALOG_TOKEN_BUDGET = int(os.getenv("LLM_CATALOG_TOKEN_BUDGET", "4000"))
+# Longest note/designation kept when the lines alone exceed the budget
+LLM_CONTEXT_MIN_CELL_CHARS = 60
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken (o200k_base, gpt-4o family) when installed, else ~3.5 chars per token (French text)."""
+    global _encoding
+    if tiktoken is None:
+        return int(len(text) / 3.5) + 1
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return len(_encoding.encode(text))
+
+
+def _cell(value, max_chars: Optional[int] = None) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        # Fixed decimals, no exponent (":g" keeps 6 significant digits: 12345.67 -> 12345.7).
+        # Prices and quantities are copied back by the model: they must be exact
+        value = f"{value:.10f}".rstrip("0").rstrip(".")
+    text = str(value).replace("|", "/").replace("\n", " ").strip()
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars - 1] + "…"
+    return text
+
+
+def _table(header: Sequence[str], rows: Iterable[Sequence]) -> str:
+    # Pipe-separated table: the column names are written once instead of once per row (JSON)
+    return "\n".join([" | ".join(header)] + [" | ".join(row) for row in rows])
+
+
+LINE_COLUMNS = ("label", "quantity", "unit", "unit_price_ht", "tva_rate", "lot", "note")
+CATALOG_COLUMNS = ("label", "unit", "price_ht", "tva", "category")
+
+
+def encode_lines(lignes, max_chars: Optional[int] = None) -> str:
+    # Same column names as the expected output (LLMQuoteLine): ids, devis_id, total_ht... are not sent
+    rows = (
+        (_cell(l.designation, max_chars), _cell(l.qte), _cell(l.unite), _cell(l.pu_ht), _cell(l.tva), _cell(l.lot), _cell(l.note, max_chars))
+        for l in lignes
+    )
+    return _table(LINE_COLUMNS, rows)
+
+
+def _catalog_row(item: dict) -> str:
+    return " | ".join((_cell(item.get("label")), _cell(item.get("unit")), _cell(item.get("price_ht")), _cell(item.get("tva")), _cell(item.get("category"))))
+
+
+def encode_catalog(items: List[dict]) -> str:
+    return "\n".join([" | ".join(CATALOG_COLUMNS)] + [_catalog_row(i) for i in items])
+
+
+_WORD = re.compile(r"[a-zà-ÿ0-9]{3,}")
+
+
+def _words(text: str) -> set:
+    # Naive French plural folding: "fenêtres" matches "Fenêtre", "tuyaux" matches "tuyau"
+    return {w[:-1] if len(w) > 3 and w[-1] in "sx" else w for w in _WORD.findall((text or "").lower())}
+
+
+def catalog_matches(message: str, items: List[dict]) -> bool:
+    """True if the message names something found in the catalog (labels / categories)."""
+    message_words = _words(message)
+    if not message_words:
+        return False
+    return any(message_words & _words(f"{i.get('label', '')} {i.get('category', '')}") for i in items)
+
+
+def rank_catalog(items: List[dict], message: str, lignes) -> List[dict]:
+    """Relevant items only, most relevant first: words shared with the user message (x2) and the current lines."""
+    message_words = _words(message)
+    line_words = set().union(*(_words(l.designation) for l in lignes)) if lignes else set()
+
+    def score(item):
+        words = _words(f"{item.get('label', '')} {item.get('category', '')}")
+        return 2 * len(words & message_words) + len(words & line_words)
+
+    scored = [(score(item), item) for item in items]
+    # sorted() is stable: equal scores keep the catalog order
+    return [item for s, item in sorted(scored, key=lambda x: x[0], reverse=True) if s > 0]
+
+
+def _catalog_sort_key(item: dict):
+    return (_cell(item.get("category")).lower(), _cell(item.get("label")).lower(), _cell(item.get("price_ht")), _cell(item.get("unit")))
+
+
+def _fill(items: List[dict], budget: int) -> Tuple[List[dict], int]:
+    kept, used = [], count_tokens(" | ".join(CATALOG_COLUMNS))
+    for item in items:
+        cost = count_tokens(_catalog_row(item)) + 1 # + newline
+        if used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    return kept, used
+
+
+def build_catalog_block(price_list: Optional[List[dict]], budget: int = LLM_CATALOG_TOKEN_BUDGET) -> Tuple[str, List[dict]]:
+    """
+    Catalog part of the prompt prefix, returns (text, items left out).
+
+    Byte-stable: depends only on the catalog content, never on its order, the
+    user message or the quote, so the provider's prompt cache keeps hitting.
+    """
+    catalog = sorted(price_list or [], key=_catalog_sort_key)
+    kept, _ = _fill(catalog, budget)
+    dropped = catalog[len(kept):]
+    parts = [f"## CATALOGUE ({len(kept)}/{len(catalog)} articles)", encode_catalog(kept) if kept else "(vide)"]
+    if dropped:
+        by_category = {}
+        for item in dropped:
+            category = item.get("category") or "Autre"
+            by_category[category] = by_category.get(category, 0) + 1
+        summary = ", ".join(f"{c}: {n}" for c, n in sorted(by_category.items()))
+        parts.append(f"({len(dropped)} autres articles — {summary} ; les plus pertinents pour la demande sont listés avec elle)")
+    return "\n".join(parts), dropped
+
+
+def build_quote_context(message: str, lignes, price_list: Optional[List[dict]], include_detailed_description: bool = False, budget: int = LLM_CONTEXT_TOKEN_BUDGET):
+    """
+    Returns (catalog block, turn block, estimated tokens) for a turn.
+
+    - catalog block: stable prefix (see build_catalog_block)
+    - turn block: current lines, then the catalog items relevant to this turn that did
+      not fit in the prefix, then the user message (last, it changes every turn)
+
+    The current lines are always sent in full (the model returns the whole quote and
+    would drop missing lines); long cells are shortened if they alone exceed the budget.
+    """
+    catalog_block, dropped = build_catalog_block(price_list, min(budget, LLM_CATALOG_TOKEN_BUDGET))
+
+    lines_block = encode_lines(lignes)
+    if count_tokens(lines_block) > budget:
+        lines_block = encode_lines(lignes, max_chars=LLM_CONTEXT_MIN_CELL_CHARS)
+
+    parts = [f"## LIGNES ACTUELLES DU DEVIS ({len(lignes)})", lines_block if lignes else "(aucune)"]
+    left = budget - count_tokens(catalog_block) - count_tokens(lines_block)
+    extras, _ = _fill(rank_catalog(dropped, message, lignes), left) if dropped and left > 0 else ([], 0)
+    if extras:
+        parts += [f"## AUTRES ARTICLES DU CATALOGUE PERTINENTS ({len(extras)})", encode_catalog(extras)]
+    parts.append(f"## DESCRIPTION DÉTAILLÉE DEMANDÉE : {'oui' if include_detailed_description else 'non'}")
+    parts.append(f"## MESSAGE DE L'UTILISATEUR\n{message}")
+    turn_block = "\n".join(parts)
+
+    return catalog_block, turn_block, count_tokens(catalog_block) + count_tokens(turn_block)
@@ -1,102 +1,260 @@
-import json
-import os
-from openai import OpenAI
-from ..models.devis import Devis
-from ..models.llm import LLMQuoteResponse
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-SYSTEM_PROMPT = """Tu es l'Expert IA de Devis.ai, le meilleur assistant pour les artisans du BTP.
-Ta mission : Créer des devis précis, professionnels et rentables en un temps record.
-
-## TES CAPACITÉS
-1.  **Expertise Technique** : Tu connais parfaitement les termes du bâtiment (plomberie, électricité, gros œuvre, etc.).
-2.  **Gestion Commerciale** : Tu es poli, direct et tu vas droit au but.
-
-## RÈGLES D'OR DU CATALOGUE
-Tu as accès à une liste de prix fournie dans le contexte (variable `price_list_catalog`).
-1.  **PRIORITÉ ABSOLUE** : Si l'utilisateur demande "Pose de fenêtre" et que tu as "Pose fenêtre PVC - 300€" dans le catalogue, TU DOIS UTILISER CETTE LIGNE EXACTE (Label et Prix).
-2.  Si tu ne trouves pas d'article exact, alors ESTIME le prix au plus juste selon les standards du marché français 2024.
-
-## INSTRUCTIONS DE RAISONNEMENT (CHAIN OF THOUGHT)
-Avant de répondre, réfléchis étape par étape dans le champ `reasoning` :
-1.  Analyse la demande de l'utilisateur.
-2.  Cherche des correspondances dans le catalogue.
-3.  Vérifie s'il manque des infos (dimensions, matériaux).
-4.  Décide de l'action : Faut-il mettre à jour le devis ? Poser une question ? Juste discuter ?
-
-## FORMAT DE SORTIE
-Tu dois TOUJOURS répondre en suivant le schéma JSON strict fourni.
-- `reasoning` : Ton analyse interne.
-- `action` : "update_quote" pour modifier le devis, "ask_clarification" si tu as besoin d'infos vitales, "just_chat" pour le reste.
-- `lines` : La liste TOTALE des lignes du devis (pas juste les nouvelles, renvoie tout l'état désiré).
-- `assistant_message` : Ta réponse à l'utilisateur.
-"""
-
-def propose_quote_update(
-    message_user: str,
-    devis: Devis,
-    include_detailed_description: bool = False,
-    price_list: list[dict] = None,
-    image_base64: str = None
-) -> LLMQuoteResponse:
-    
-    # Context construction
-    context_data = {
-        "current_quote_lines": [l.dict() for l in devis.lignes],
-        "price_list_catalog": price_list or [],
-        "user_message": message_user,
-        "include_detailed_description": include_detailed_description
-    }
-    
-    # Prepare messages
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    
-    user_text = f"Voici le contexte JSON actuel : {json.dumps(context_data, default=str)}"
-
-    if image_base64:
-        # Multimodal message with GPT-4o
-        messages.append({
-            "role": "user", 
-            "content": [
-                {
-                    "type": "text", 
-                    "text": user_text + "\n\nANALYSE L'IMAGE FOURNIE pour extraire les travaux à chiffrer. Sois précis sur les quantités."
-                },
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{image_base64}"
-                    }
-                }
-            ]
-        })
-    else:
-        # Standard text message
-        messages.append({"role": "user", "content": user_text})
-    
-    try:
-        # Using Structural Output (Structured Outputs)
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o", # Upgrade to High Intelligence Model
-            messages=messages,
-            response_format=LLMQuoteResponse,
-            temperature=0.2, # Low temperature for precision
-        )
-        
-        response = completion.choices[0].message.parsed
-        
-        # Log reasoning for debugging/audit
-        print(f"=== AI REASONING ===\n{response.reasoning}\n====================")
-        
-        return response
-        
-    except Exception as e:
-        print(f"LLM Structure Error: {e}")
-        # Robust Fallback
-        return LLMQuoteResponse(
-            reasoning="Error fallback",
-            action="just_chat",
-            assistant_message="Désolé, j'ai rencontré une erreur interne lors de l'analyse (Structure invalide). Peux-tu reformuler ?",
-            lines=[]
-        )
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from ..models.devis import Devis
+from ..models.llm import LLMQuoteResponse
+from .metrics import LLM_ESCALATIONS, LLM_FALLBACKS, LLM_ROUTES, cached_tokens, record_llm_usage
+from .logging_config import LOG_REASONING_SAMPLE_RATE, sampled
+from .llm_client import get_llm_client, llm_timeout
+from .llm_context import build_quote_context, catalog_matches
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from openai.types import CompletionUsage
+
+LLM_MODEL = "gpt-4o" # Upgrade to High Intelligence Model
+# Per-turn routing (route_model): simple turns go to the small model, escalated to LLM_MODEL on failure
+LLM_SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "gpt-4o-mini")
+LLM_ROUTING = os.getenv("LLM_ROUTING", "1") != "0"
+LLM_ROUTE_MAX_CHARS = int(os.getenv("LLM_ROUTE_MAX_CHARS", "200"))
+LLM_ROUTE_MAX_LINES = int(os.getenv("LLM_ROUTE_MAX_LINES", "25"))
+# The user is waiting on the turn: fail fast enough to show the fallback message
+LLM_CHAT_TIMEOUT = float(os.getenv("LLM_CHAT_TIMEOUT", "60"))
+# Rolling conversation summary (see conversation_service), written by the small model
+LLM_SUMMARY_MAX_CHARS = int(os.getenv("LLM_SUMMARY_MAX_CHARS", "1200"))
+
+SYSTEM_PROMPT = """Tu es l'Expert IA de Devis.ai, le meilleur assistant pour les artisans du BTP.
+Ta mission : Créer des devis précis, professionnels et rentables en un temps record.
+
+## TES CAPACITÉS
+1.  **Expertise Technique** : Tu connais parfaitement les termes du bâtiment (plomberie, électricité, gros œuvre, etc.).
+2.  **Gestion Commerciale** : Tu es poli, direct et tu vas droit au but.
+
+## CONTEXTE DE LA CONVERSATION
+Les derniers échanges (et un résumé des plus anciens) te sont fournis pour éviter de redemander ce qui a déjà été dit. L'état du devis fait foi : section `LIGNES ACTUELLES DU DEVIS`.
+
+## RÈGLES D'OR DU CATALOGUE
+Tu as accès à une liste de prix fournie dans le contexte (section `CATALOGUE`).
+Les lignes du devis et le catalogue sont des tableaux : une ligne par article, colonnes séparées par `|`, la première ligne donne les noms des colonnes.
+1.  **PRIORITÉ ABSOLUE** : Si l'utilisateur demande "Pose de fenêtre" et que tu as "Pose fenêtre PVC - 300€" dans le catalogue, TU DOIS UTILISER CETTE LIGNE EXACTE (Label et Prix).
+2.  Si tu ne trouves pas d'article exact, alors ESTIME le prix au plus juste selon les standards du marché français 2024.
+
+## INSTRUCTIONS DE RAISONNEMENT (CHAIN OF THOUGHT)
+Avant de répondre, réfléchis étape par étape dans le champ `reasoning` :
+1.  Analyse la demande de l'utilisateur.
+2.  Cherche des correspondances dans le catalogue.
+3.  Vérifie s'il manque des infos (dimensions, matériaux).
+4.  Décide de l'action : Faut-il mettre à jour le devis ? Poser une question ? Juste discuter ?
+
+## FORMAT DE SORTIE
+Tu dois TOUJOURS répondre en suivant le schéma JSON strict fourni.
+- `reasoning` : Ton analyse interne.
+- `action` : "update_quote" pour modifier le devis, "ask_clarification" si tu as besoin d'infos vitales, "just_chat" pour le reste.
+- `lines` : La liste TOTALE des lignes du devis (pas juste les nouvelles, renvoie tout l'état désiré).
+- `assistant_message` : Ta réponse à l'utilisateur.
+"""
+
+SUMMARY_PROMPT = """Tu résumes la conversation entre un artisan et l'assistant qui rédige son devis.
+Mets à jour le résumé existant avec les nouveaux messages. Garde seulement ce qui sert pour la suite :
+demandes du client, choix et contraintes (matériaux, dimensions, délais, budget), questions encore ouvertes.
+Ne recopie pas les lignes du devis (elles sont fournies à chaque tour).
+Réponds en français, en puces courtes, {max_chars} caractères maximum."""
+
+def route_model(message_user: str, devis: Devis, price_list: Optional[list], image_base64: Optional[str]) -> Tuple[str, str]:
+    """
+    (model, reason) for a turn, from cheap local signals. The small model handles
+    short follow-ups ("merci", a quantity tweak, a clarification answer).
+    """
+    if not LLM_ROUTING:
+        return LLM_MODEL, "routing_disabled"
+    if image_base64:
+        return LLM_MODEL, "image"
+    if len(message_user) > LLM_ROUTE_MAX_CHARS:
+        return LLM_MODEL, "long_message"
+    if len(devis.lignes) > LLM_ROUTE_MAX_LINES:
+        return LLM_MODEL, "many_lines"
+    if price_list and catalog_matches(message_user, price_list):
+        # Picking the exact catalog item (label + price) is where the small model errs
+        return LLM_MODEL, "catalog_match"
+    return LLM_SMALL_MODEL, "simple"
+
+
+def _call_model(model: str, messages: list):
+    """One structured-output call. Returns (parsed response or None, usage or None, error or None)."""
+    completion = None
+    started = time.perf_counter()
+    try:
+        # Using Structural Output (Structured Outputs)
+        completion = get_llm_client().beta.chat.completions.parse(
+            model=model,
+            messages=messages,
+            response_format=LLMQuoteResponse,
+            temperature=0.2, # Low temperature for precision
+            timeout=llm_timeout(LLM_CHAT_TIMEOUT),
+        )
+        record_llm_usage(model, time.perf_counter() - started, completion.usage)
+        response = completion.choices[0].message.parsed
+        if response is None:
+            # Refusal or output that didn't match the schema
+            raise ValueError(completion.choices[0].message.refusal or "empty structured output")
+        return response, completion.usage, None
+    except Exception as e:
+        logger.warning("LLM structure error: %s", e, extra={"model": model})
+        if completion is None:
+            record_llm_usage(model, time.perf_counter() - started) # Failed call: latency only
+        return None, (completion.usage if completion is not None else None), e
+
+
+def _invalid_output(error: Optional[Exception]) -> bool:
+    """
+    The model answered, but not with a usable quote (refusal, empty parse, schema
+    mismatch: ValueError, pydantic's ValidationError included). Only then is a bigger
+    model worth a second call: timeouts and API errors go straight to the fallback.
+    """
+    return isinstance(error, ValueError)
+
+
+def build_messages(
+    message_user: str,
+    lignes,
+    price_list: Optional[list],
+    include_detailed_description: bool = False,
+    image_base64: Optional[str] = None,
+    summary: Optional[str] = None,
+    history: Optional[List[Tuple[str, str]]] = None
+) -> list:
+    """
+    Messages of a turn, laid out for provider-side prompt caching (exact prefix match):
+    [system prompt, catalog] is byte-identical from one turn to the next for the same
+    catalog; then the conversation (summary, last messages as (role, content)); everything
+    that changes per turn (lines, relevant extras, flag, message, image) is in the last message.
+    """
+    catalog_block, turn_block, context_tokens = build_quote_context(message_user, lignes, price_list, include_detailed_description)
+    logger.debug("LLM context built", extra={"context_tokens": context_tokens, "lines": len(lignes), "catalog": len(price_list or [])})
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": catalog_block},
+    ]
+    if summary:
+        messages.append({"role": "system", "content": f"## RÉSUMÉ DE LA CONVERSATION\n{summary}"})
+    for role, content in history or []:
+        messages.append({"role": role, "content": content})
+    if image_base64:
+        # Multimodal message with GPT-4o
+        messages.append({
+            "role": "user", 
+            "content": [
+                {
+                    "type": "text", 
+                    "text": turn_block + "\n\nANALYSE L'IMAGE FOURNIE pour extraire les travaux à chiffrer. Sois précis sur les quantités."
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{image_base64}"
+                    }
+                }
+            ]
+        })
+    else:
+        # Standard text message
+        messages.append({"role": "user", "content": turn_block})
+    return messages
+
+
+def propose_quote_update(
+    message_user: str,
+    devis: Devis,
+    include_detailed_description: bool = False,
+    price_list: list[dict] = None,
+    image_base64: str = None,
+    model: Optional[str] = None,
+    summary: Optional[str] = None,
+    history: Optional[List[Tuple[str, str]]] = None
+) -> Tuple[LLMQuoteResponse, List[Tuple[str, "CompletionUsage"]]]:
+    """
+    Returns the LLM answer and the token usage of each call made, as (model, usage).
+    Without `model`, the model is routed per turn (route_model) and an invalid
+    small-model answer is retried once with LLM_MODEL.
+    `summary` / `history`: conversation memory (see conversation_service.load_history).
+    """
+    
+    messages = build_messages(message_user, devis.lignes, price_list, include_detailed_description, image_base64, summary, history)
+
+    if model:
+        reason = "forced" # e.g. soft budget reached: no routing, no escalation
+    else:
+        model, reason = route_model(message_user, devis, price_list, image_base64)
+
+    started = time.perf_counter()
+    calls = []
+    response, usage, error = _call_model(model, messages)
+    if usage is not None:
+        calls.append((model, usage))
+
+    escalated = False
+    if response is None and _invalid_output(error) and model != LLM_MODEL and reason != "forced":
+        # Small model failed validation: escalate once to the big model
+        escalated = True
+        LLM_ESCALATIONS.labels(model, LLM_MODEL).inc()
+        model = LLM_MODEL
+        response, usage, error = _call_model(model, messages)
+        if usage is not None:
+            calls.append((model, usage))
+
+    LLM_ROUTES.labels(model, reason, str(escalated).lower()).inc()
+    logger.info("LLM turn routed", extra={
+        "model": model,
+        "route_reason": reason,
+        "escalated": escalated,
+        "latency_ms": round((time.perf_counter() - started) * 1000),
+        "prompt_tokens": sum(u.prompt_tokens or 0 for _, u in calls),
+        "completion_tokens": sum(u.completion_tokens or 0 for _, u in calls),
+        "cached_tokens": sum(cached_tokens(u) for _, u in calls),
+    })
+
+    if response is None:
+        LLM_FALLBACKS.labels(model).inc()
+        # Robust Fallback
+        return LLMQuoteResponse(
+            reasoning="Error fallback",
+            action="just_chat",
+            assistant_message="Désolé, j'ai rencontré une erreur interne lors de l'analyse (Structure invalide). Peux-tu reformuler ?",
+            lines=[]
+        ), calls
+
+    # Log reasoning for debugging/audit (sampled + truncated: it can be several KB per turn)
+    if sampled(LOG_REASONING_SAMPLE_RATE):
+        logger.info("LLM reasoning", extra={"model": model, "action": response.action, "reasoning": response.reasoning})
+    return response, calls
+
+
+def summarize_conversation(previous_summary: str, messages: List[Tuple[str, str]]) -> Tuple[Optional[str], str, Optional["CompletionUsage"]]:
+    """
+    Folds `messages` ((role, content), oldest first) into the previous summary.
+    Returns (new summary or None on failure, model, usage).
+    """
+    model = LLM_SMALL_MODEL
+    transcript = "\n".join(f"{'Artisan' if role == 'user' else 'Assistant'} : {content}" for role, content in messages)
+    started = time.perf_counter()
+    try:
+        completion = get_llm_client().chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT.format(max_chars=LLM_SUMMARY_MAX_CHARS)},
+                {"role": "user", "content": f"## RÉSUMÉ ACTUEL\n{previous_summary or '(aucun)'}\n\n## NOUVEAUX MESSAGES\n{transcript}"},
+            ],
+            temperature=0.2,
+            max_tokens=LLM_SUMMARY_MAX_CHARS // 2, # ~3.5 chars per token, with margin
+            timeout=llm_timeout(LLM_CHAT_TIMEOUT),
+        )
+    except Exception as e:
+        record_llm_usage(model, time.perf_counter() - started)
+        logger.warning("Conversation summary failed: %s", e, extra={"model": model})
+        return None, model, None
+    record_llm_usage(model, time.perf_counter() - started, completion.usage)
+    text = (completion.choices[0].message.content or "").strip()[:LLM_SUMMARY_MAX_CHARS]
+    return text or None, model, completion.usage
@@ -0,0 +1,98 @@
+import base64
+import hashlib
+import io
+import os
+from typing import Dict, Optional
+from sqlmodel import delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+
+from ..models.entreprise import Entreprise
+from ..models.logo import EntrepriseLogo
+
+# Public prefix of the API as seen by the browser (Next.js proxies /api -> backend)
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "/api").rstrip("/")
+
+# Max size (px) of each pre-generated variant
+# - thumb: settings screen / header (displayed ~48px, 2x for retina)
+# - print: PDF header (25mm at ~600 dpi)
+LOGO_VARIANTS = {
+    "thumb": 128,
+    "print": 600,
+}
+
+
+class InvalidLogo(ValueError):
+    pass
+
+
+def is_data_uri(value: Optional[str]) -> bool:
+    return bool(value) and value.strip().startswith("data:image")
+
+
+def decode_data_uri(value: str) -> bytes:
+    try:
+        header, b64data = value.strip().split(",", 1)
+        return base64.b64decode(b64data)
+    except Exception:
+        raise InvalidLogo("Logo illisible (data URI invalide)")
+
+
+def build_variants(raw: bytes) -> Dict[str, bytes]:
+    """Resize the uploaded image once into every variant (PNG, alpha kept)."""
+    from PIL import Image
+
+    try:
+        img = Image.open(io.BytesIO(raw))
+        img.load()
+    except Exception:
+        raise InvalidLogo("Le logo n'est pas une image valide")
+
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA")
+
+    variants = {}
+    for variant, max_px in LOGO_VARIANTS.items():
+        resized = img.copy()
+        resized.thumbnail((max_px, max_px))
+        buf = io.BytesIO()
+        resized.save(buf, format="PNG", optimize=True)
+        variants[variant] = buf.getvalue()
+    return variants
+
+
+def logo_url(entreprise_id: int, version: str, variant: str = "thumb") -> str:
+    return f"{PUBLIC_API_URL}/entreprise/{entreprise_id}/logo/{variant}?v={version}"
+
+
+async def save_logo(session: AsyncSession, ent: Entreprise, data_uri: str) -> None:
+    """
+    Stocke le logo (data URI) dans la table des logos et remplace
+    ent.logo_url par une URL courte. Ne commit pas.
+    """
+    raw = decode_data_uri(data_uri)
+    # Pillow work is CPU-bound
+    variants = await run_in_threadpool(build_variants, raw)
+    version = hashlib.sha1(raw).hexdigest()[:12]
+
+    await session.exec(delete(EntrepriseLogo).where(EntrepriseLogo.entreprise_id == ent.id))
+    for variant, data in variants.items():
+        session.add(EntrepriseLogo(entreprise_id=ent.id, variant=variant, version=version, data=data))
+    ent.logo_url = logo_url(ent.id, version)
+    session.add(ent)
+
+
+async def delete_logo(session: AsyncSession, entreprise_id: int) -> None:
+    await session.exec(delete(EntrepriseLogo).where(EntrepriseLogo.entreprise_id == entreprise_id))
+
+
+async def get_logo(session: AsyncSession, entreprise_id: int, variant: str) -> Optional[EntrepriseLogo]:
+    return await session.get(EntrepriseLogo, (entreprise_id, variant))
+
+
+async def get_print_logo(session: AsyncSession, ent: Entreprise) -> Optional[bytes]:
+    """Bytes of the PDF-size logo, or None (no logo / external URL / legacy data URI)."""
+    if not ent.logo_url or f"/entreprise/{ent.id}/logo/" not in ent.logo_url:
+        return None
+    logo = await get_logo(session, ent.id, "print")
+    return logo.data if logo else None
@@ -0,0 +1,102 @@
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Exposed on /metrics (Prometheus text format). Labels stay low-cardinality:
+# routes are templates ("/devis/{devis_id}/pdf"), never raw paths.
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40),
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being processed")
+
+DB_POOL_CHECKED_OUT = Gauge("db_pool_connections_checked_out", "DB connections currently checked out of the pool")
+DB_POOL_SIZE = Gauge("db_pool_size", "DB pool size")
+
+PDF_RENDER_SECONDS = Histogram(
+    "pdf_render_duration_seconds",
+    "PDF generation time",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds",
+    "LLM call latency",
+    ["model"],
+    buckets=(0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens consumed", ["model", "kind"]) # kind: prompt, completion, cached (part of prompt)
+LLM_FALLBACKS = Counter("llm_fallbacks_total", "LLM calls answered by the fallback response", ["model"])
+LLM_ROUTES = Counter("llm_routes_total", "Chat turns per final model and routing reason", ["model", "reason", "escalated"])
+LLM_ESCALATIONS = Counter("llm_escalations_total", "Small-model answers retried with the big model", ["from_model", "to_model"])
+
+# Admission control (services/admission.py): kind = chat, pdf, price_list, export
+ADMISSION_QUEUE_DEPTH = Gauge("admission_queue_depth", "Requests waiting in the fair queue", ["kind"])
+ADMISSION_IN_USE = Gauge("admission_capacity_in_use", "Cost units of the admitted requests being processed")
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_queue_wait_seconds",
+    "Time spent in the fair queue",
+    ["kind"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+ADMISSION_REJECTIONS = Counter("admission_rejections_total", "Requests refused with a 429", ["kind", "reason"]) # rate_limit, queue_full, queue_timeout
+
+
+def instrument_pool(engine):
+    """Pool usage is read at scrape time (nothing to maintain on the hot path)."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    # NullPool/StaticPool have no counters: the gauges then stay at 0
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    if hasattr(pool, "size"):
+        DB_POOL_SIZE.set_function(pool.size)
+
+
+def cached_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prompt cache (0 when not reported)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+
+def record_llm_usage(model: str, duration: float, usage=None):
+    LLM_LATENCY.labels(model).observe(duration)
+    if usage is not None:
+        LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+        LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+        LLM_TOKENS.labels(model, "cached").inc(cached_tokens(usage))
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: latency per route template + in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
@@ -0,0 +1,41 @@
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.devis import Devis, DevisCounter
+
+
+async def _increment(session: AsyncSession, entreprise_nom: str):
+    statement = (
+        update(DevisCounter)
+        .where(DevisCounter.entreprise_nom == entreprise_nom)
+        .values(last_number=DevisCounter.last_number + 1)
+        .returning(DevisCounter.last_number)
+    )
+    return (await session.execute(statement)).scalar_one_or_none()
+
+
+async def next_devis_number(session: AsyncSession, entreprise_nom: str) -> int:
+    """
+    Attribue le prochain numéro de devis de l'entreprise.
+
+    Single-row `UPDATE ... RETURNING` on the enterprise counter: the row lock
+    serializes concurrent quote creations and is released at commit, so the
+    number must be allocated in the same transaction as the Devis insert
+    (a rollback gives the number back => no gaps, no duplicates).
+    """
+    number = await _increment(session, entreprise_nom)
+    if number is not None:
+        return number
+
+    # First quote since the counter exists: seed it from the existing quotes (one-off)
+    max_num = (await session.exec(select(func.max(Devis.number)).where(Devis.entreprise_nom == entreprise_nom))).first()
+    insert = pg_insert if session.bind.dialect.name == "postgresql" else sqlite_insert
+    await session.execute(
+        insert(DevisCounter)
+        .values(entreprise_nom=entreprise_nom, last_number=max_num or 0)
+        .on_conflict_do_nothing(index_elements=["entreprise_nom"])
+    )
+    return await _increment(session, entreprise_nom)
@@ -1,70 +1,76 @@
-import os
-import pandas as pd
-from pypdf import PdfReader
-from openai import OpenAI
-import json
-from ..models.llm import LLMQuoteResponse # We might need a new model for price items
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def parse_price_list_file(file_path: str, file_ext: str) -> list[dict]:
-    text_content = ""
-    
-    try:
-        if file_ext.lower() in ['.xlsx', '.xls', '.csv']:
-            if file_ext.lower() == '.csv':
-                df = pd.read_csv(file_path)
-            else:
-                df = pd.read_excel(file_path)
-            text_content = df.to_string()
-        elif file_ext.lower() == '.pdf':
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                text_content += page.extract_text() + "\n"
-        else:
-            # Try reading as text
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                text_content = f.read()
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return []
-
-    # Use LLM to extract structured data
-    prompt = """
-    Tu es un expert en BTP et data analysis.
-    Ta mission : Transformer ce fichier (CSV/Excel/Texte) en une liste structurée d'articles pour un logiciel de devis.
-
-    Règles d'extraction :
-    1. STRICT : Si le fichier n'a AUCUN rapport avec le bâtiment/prix/catalogue (ex: recette de cuisine, roman, facture EDF), retourne une liste vide [].
-    2. EXTENSION : Trouve tous les articles possibles. Ne t'arrête pas au premier.
-    3. LABEL (Désignation) : Traduis/Corrige si nécessaire pour avoir un nom clair en français.
-    4. PRIX (HT) : Extrait le prix numérique (convertis si besoin). Si manquant, mets 0.
-    5. UNITE : Déduis l'unité (u, m2, ml, h, ens, fft). Par défaut "u".
-    6. CATEGORIE : Déduis une catégorie logique (ex: Plomberie, Electricité, Main d'oeuvre) selon le libellé.
-
-    Format de sortie JSON Strict :
-    {
-        "items": [
-            {"label": "Désignation claire", "price_ht": 0.0, "unit": "u", "category": "Catégorie", "tva_rate": 0.2},
-            ...
-        ]
-    }
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": text_content[:60000]} # Increased context for larger catalogs
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1
-        )
-        
-        content = response.choices[0].message.content
-        data = json.loads(content)
-        return data.get("items", [])
-    except Exception as e:
-        print(f"LLM Extraction Error: {e}")
-        return []
+import os
+import logging
+import json
+from ..models.llm import LLMQuoteResponse # We might need a new model for price items
+from .llm_client import get_llm_client, llm_timeout
+
+# Big catalogs (up to 60k chars) take longer than a chat turn
+LLM_PARSE_TIMEOUT = float(os.getenv("LLM_PARSE_TIMEOUT", "180"))
+
+logger = logging.getLogger(__name__)
+
+def parse_price_list_file(file_path: str, file_ext: str) -> list[dict]:
+    text_content = ""
+    
+    try:
+        # Heavy parsers are imported on first upload (not at app startup)
+        if file_ext.lower() in ['.xlsx', '.xls', '.csv']:
+            import pandas as pd
+            if file_ext.lower() == '.csv':
+                df = pd.read_csv(file_path)
+            else:
+                df = pd.read_excel(file_path)
+            text_content = df.to_string()
+        elif file_ext.lower() == '.pdf':
+            from pypdf import PdfReader
+            reader = PdfReader(file_path)
+            for page in reader.pages:
+                text_content += page.extract_text() + "\n"
+        else:
+            # Try reading as text
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                text_content = f.read()
+    except Exception as e:
+        logger.warning("Error reading price list file: %s", e, extra={"file_ext": file_ext})
+        return []
+
+    # Use LLM to extract structured data
+    prompt = """
+    Tu es un expert en BTP et data analysis.
+    Ta mission : Transformer ce fichier (CSV/Excel/Texte) en une liste structurée d'articles pour un logiciel de devis.
+
+    Règles d'extraction :
+    1. STRICT : Si le fichier n'a AUCUN rapport avec le bâtiment/prix/catalogue (ex: recette de cuisine, roman, facture EDF), retourne une liste vide [].
+    2. EXTENSION : Trouve tous les articles possibles. Ne t'arrête pas au premier.
+    3. LABEL (Désignation) : Traduis/Corrige si nécessaire pour avoir un nom clair en français.
+    4. PRIX (HT) : Extrait le prix numérique (convertis si besoin). Si manquant, mets 0.
+    5. UNITE : Déduis l'unité (u, m2, ml, h, ens, fft). Par défaut "u".
+    6. CATEGORIE : Déduis une catégorie logique (ex: Plomberie, Electricité, Main d'oeuvre) selon le libellé.
+
+    Format de sortie JSON Strict :
+    {
+        "items": [
+            {"label": "Désignation claire", "price_ht": 0.0, "unit": "u", "category": "Catégorie", "tva_rate": 0.2},
+            ...
+        ]
+    }
+    """
+    
+    try:
+        response = get_llm_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": text_content[:60000]} # Increased context for larger catalogs
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.1,
+            timeout=llm_timeout(LLM_PARSE_TIMEOUT)
+        )
+        
+        content = response.choices[0].message.content
+        data = json.loads(content)
+        return data.get("items", [])
+    except Exception as e:
+        logger.warning("LLM extraction error: %s", e)
+        return []
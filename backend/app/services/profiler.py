@@ -0,0 +1,110 @@
+import asyncio
+import cProfile
+import hmac
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+try:
+    # Optional: sampling profiler with a speedscope export (pip install pyinstrument)
+    from pyinstrument import Profiler as SamplingProfiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    SamplingProfiler = None
+
+# Profiling is disabled unless an admin key is configured
+ADMIN_KEY = os.getenv("ADMIN_KEY", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "20"))
+
+# One capture at a time: profilers are process-wide
+_lock = asyncio.Lock()
+
+
+def is_admin_key(key: Optional[str]) -> bool:
+    return bool(ADMIN_KEY) and key is not None and hmac.compare_digest(key, ADMIN_KEY)
+
+
+def _requested(scope) -> bool:
+    """X-Profile: 1 + X-Admin-Key headers, or ?profile=1&admin_key=... (links opened from a browser)."""
+    headers = dict(scope["headers"])
+    if headers.get(b"x-profile") == b"1":
+        return is_admin_key(headers.get(b"x-admin-key", b"").decode("latin-1"))
+    query = scope.get("query_string", b"")
+    if b"profile=1" in query:
+        params = parse_qs(query.decode("latin-1"))
+        return params.get("profile") == ["1"] and is_admin_key((params.get("admin_key") or [None])[0])
+    return False
+
+
+def _prune():
+    # Bounded retention: keep the newest PROFILE_MAX_FILES captures
+    files = sorted(PROFILE_DIR.glob("*.*"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[PROFILE_MAX_FILES:]:
+        old.unlink(missing_ok=True)
+
+
+def list_profiles() -> List[dict]:
+    if not PROFILE_DIR.exists():
+        return []
+    files = sorted(PROFILE_DIR.glob("*.*"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [{"name": p.name, "size": p.stat().st_size, "created_at": p.stat().st_mtime} for p in files]
+
+
+def get_profile_path(name: str) -> Optional[Path]:
+    path = PROFILE_DIR / name
+    # Names come from the URL: no path traversal
+    if path.name != name or not path.is_file():
+        return None
+    return path
+
+
+class ProfilerMiddleware:
+    """
+    Pure ASGI middleware profiling single requests on demand (admin key required).
+    Uses pyinstrument (speedscope JSON) when installed, cProfile (pstats) otherwise.
+    Only the event loop thread is profiled: threadpool work (LLM, PDF) shows as awaited time.
+    Other requests are untouched: one header lookup, no profiler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMIN_KEY or not _requested(scope) or _lock.locked():
+            return await self.app(scope, receive, send)
+
+        async with _lock:
+            method = scope["method"]
+            route = "".join(c if c.isalnum() or c in "-_" else "_" for c in scope["path"].strip("/")) or "root"
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{method}-{route}-{uuid.uuid4().hex[:6]}"
+            name += ".speedscope.json" if SamplingProfiler else ".pstats"
+
+            async def send_with_profile_id(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-id", name.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            if SamplingProfiler:
+                profiler = SamplingProfiler(async_mode="enabled")
+                profiler.start()
+                try:
+                    await self.app(scope, receive, send_with_profile_id)
+                finally:
+                    profiler.stop()
+                    (PROFILE_DIR / name).write_text(profiler.output(SpeedscopeRenderer()))
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, send_with_profile_id)
+                finally:
+                    profiler.disable()
+                    profiler.dump_stats(PROFILE_DIR / name)
+            _prune()
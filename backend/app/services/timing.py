@@ -0,0 +1,147 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this (ms) log their whole span tree. 0 = disabled.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+
+class Span:
+    """A timed section of a request. DB queries are aggregated per parent span (count + total)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None # seconds, None while running
+        self.count = 1
+        self.children: List["Span"] = []
+
+    def child(self, name: str) -> "Span":
+        span = Span(name)
+        self.children.append(span)
+        return span
+
+    def add_query(self, duration: float):
+        # Consecutive queries of a span are merged: keeps the tree small with many queries
+        last = self.children[-1] if self.children else None
+        if last is not None and last.name == "db":
+            last.count += 1
+            last.duration += duration
+        else:
+            span = self.child("db")
+            span.duration = duration
+
+    def close(self):
+        self.duration = time.perf_counter() - self.start
+
+    def totals(self, into: Optional[Dict[str, list]] = None, inside: frozenset = frozenset()) -> Dict[str, list]:
+        """{name: [total seconds, count]} over the descendants (a span nested in a span of the same name is not counted twice)."""
+        into = {} if into is None else into
+        for span in self.children:
+            if span.name not in inside:
+                entry = into.setdefault(span.name, [0.0, 0])
+                entry[0] += span.duration or 0.0
+                entry[1] += span.count
+            span.totals(into, inside | {span.name})
+        return into
+
+    def format_tree(self, depth: int = 0) -> str:
+        duration = (self.duration or 0.0) * 1000
+        suffix = f" x{self.count}" if self.count > 1 else ""
+        lines = [f"{'  ' * depth}{self.name}{suffix} {duration:.1f}ms"]
+        lines += [child.format_tree(depth + 1) for child in self.children]
+        return "\n".join(lines)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times a section of the current request (no-op outside a request, e.g. background workers).
+    Usage:
+        with span("llm"):
+            response = await run_in_threadpool(...)
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    current = parent.child(name)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.close()
+        _current_span.reset(token)
+
+
+def server_timing_header(root: Span) -> str:
+    # Server-Timing: db;dur=12.3;desc="4 queries", llm;dur=8012.0, total;dur=8040.2
+    metrics = []
+    for name, (duration, count) in root.totals().items():
+        metric = f"{name};dur={duration * 1000:.1f}"
+        if name == "db":
+            metric += f';desc="{count} queries"'
+        elif count > 1:
+            metric += f';desc="x{count}"'
+        metrics.append(metric)
+    metrics.append(f"total;dur={(root.duration or 0.0) * 1000:.1f}")
+    return ", ".join(metrics)
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware (does not buffer streaming responses): opens the root span of
+    each HTTP request and adds the Server-Timing header when the response starts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        root = Span(f"{scope['method']} {scope['path']}")
+        token = _current_span.set(root)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                root.close()
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing_header(root).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            root.close() # Full duration, streamed body included
+            _current_span.reset(token)
+            if SLOW_REQUEST_MS and root.duration * 1000 >= SLOW_REQUEST_MS:
+                logger.warning("Slow request (%.0fms):\n%s", root.duration * 1000, root.format_tree())
+
+
+def instrument_engine(engine):
+    """Times every SQL query into the current span (events live on the sync engine behind an AsyncEngine)."""
+    target = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._timing_start = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        current = _current_span.get()
+        if current is not None and context is not None:
+            current.add_query(time.perf_counter() - context._timing_start)
@@ -0,0 +1,93 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.usage import LLMUsage, LLMUsageDaily
+from .metrics import cached_tokens as _cached_tokens
+
+# Daily token budgets per entreprise (prompt + completion), 0 = unlimited.
+# Soft: switch to the cheap model. Hard: refuse the turn before calling the LLM.
+LLM_SOFT_BUDGET_TOKENS = int(os.getenv("LLM_SOFT_BUDGET_TOKENS", "0"))
+LLM_HARD_BUDGET_TOKENS = int(os.getenv("LLM_HARD_BUDGET_TOKENS", "0"))
+LLM_CHEAP_MODEL = os.getenv("LLM_CHEAP_MODEL", "gpt-4o-mini")
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+async def tokens_used_today(session: AsyncSession, entreprise_nom: str) -> int:
+    statement = select(func.sum(LLMUsageDaily.prompt_tokens + LLMUsageDaily.completion_tokens)).where(
+        LLMUsageDaily.entreprise_nom == entreprise_nom, LLMUsageDaily.day == _today()
+    )
+    return (await session.exec(statement)).first() or 0
+
+
+async def choose_model(session: AsyncSession, entreprise_nom: Optional[str], model: Optional[str] = None) -> Optional[str]:
+    """
+    Modèle à utiliser pour ce tour selon la consommation du jour de l'entreprise
+    (`model` inchangé, None = routage normal, sinon le modèle économique).
+    Lève BudgetExceeded si le budget dur est atteint.
+    """
+    if not entreprise_nom or not (LLM_SOFT_BUDGET_TOKENS or LLM_HARD_BUDGET_TOKENS):
+        return model
+    used = await tokens_used_today(session, entreprise_nom)
+    if LLM_HARD_BUDGET_TOKENS and used >= LLM_HARD_BUDGET_TOKENS:
+        raise BudgetExceeded(f"{used} tokens used today, hard budget is {LLM_HARD_BUDGET_TOKENS}")
+    if LLM_SOFT_BUDGET_TOKENS and used >= LLM_SOFT_BUDGET_TOKENS:
+        return LLM_CHEAP_MODEL
+    return model
+
+
+async def record_usage(session: AsyncSession, entreprise_nom: str, model: str, usage, devis_id: Optional[str] = None):
+    """Stores the call and updates the daily rollup (upsert). Committed by the caller."""
+    prompt_tokens = usage.prompt_tokens or 0
+    completion_tokens = usage.completion_tokens or 0
+    cached_tokens = _cached_tokens(usage)
+    session.add(LLMUsage(
+        entreprise_nom=entreprise_nom,
+        devis_id=devis_id,
+        model=model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cached_tokens=cached_tokens
+    ))
+    insert = pg_insert if session.bind.dialect.name == "postgresql" else sqlite_insert
+    statement = insert(LLMUsageDaily).values(
+        entreprise_nom=entreprise_nom,
+        day=_today(),
+        model=model,
+        calls=1,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cached_tokens=cached_tokens
+    )
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=["entreprise_nom", "day", "model"],
+        set_={
+            "calls": LLMUsageDaily.calls + 1,
+            "prompt_tokens": LLMUsageDaily.prompt_tokens + statement.excluded.prompt_tokens,
+            "completion_tokens": LLMUsageDaily.completion_tokens + statement.excluded.completion_tokens,
+            "cached_tokens": LLMUsageDaily.cached_tokens + statement.excluded.cached_tokens,
+        }
+    ))
+
+
+async def get_daily_usage(session: AsyncSession, entreprise_nom: str, days: int):
+    since = _today() - timedelta(days=days - 1)
+    statement = (
+        select(LLMUsageDaily)
+        .where(LLMUsageDaily.entreprise_nom == entreprise_nom, LLMUsageDaily.day >= since)
+        .order_by(LLMUsageDaily.day.desc(), LLMUsageDaily.model)
+    )
+    return (await session.exec(statement)).all()
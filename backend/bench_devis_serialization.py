@@ -0,0 +1,84 @@
+"""
+Encode time of the /chat/turn payload for a large quote.
+
+    python bench_devis_serialization.py [nb_lignes] [runs]
+
+"before": hand-built dicts (devis.dict(), l.dict() per line) + FastAPI's
+jsonable_encoder + json.dumps, as chat_turn used to answer.
+"after": devis_serializer.chat_response (precomputed field layout + orjson).
+Both outputs are checked to decode to the same JSON.
+"""
+import gzip
+import json
+import os
+import sys
+import time
+import warnings
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.client import Client
+from app.models.devis import Devis, Ligne
+from app.services.calc_service import compute_totaux
+from app.services.devis_serializer import chat_response
+
+warnings.filterwarnings("ignore", category=DeprecationWarning) # .dict() in the old path
+
+NB_LIGNES = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+RUNS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+
+def build_devis():
+    client = Client(nom="M. Dupont", adresse="12 rue des Lilas, Lyon", entreprise_nom="ACME BTP")
+    devis = Devis(entreprise_nom="ACME BTP", number=42, client_id=client.id, objet="Rénovation salle de bain")
+    devis.client = client
+    devis.lignes = [
+        Ligne(id=i, devis_id=devis.id, designation=f"Fourniture et pose carrelage grès cérame {i}", qte=12.5, unite="m2", pu_ht=48.9, lot="Carrelage", note="Pose droite, joints gris")
+        for i in range(NB_LIGNES)
+    ]
+    return devis
+
+
+def before(devis, totaux) -> bytes:
+    devis_dict = devis.dict()
+    devis_dict["lignes"] = [l.dict() for l in devis.lignes]
+    devis_dict["totaux"] = totaux
+    devis_dict["meta"] = {
+        "devis_id": devis.id,
+        "date": devis.date,
+        "statut": devis.statut,
+        "theme": devis.theme,
+        "accent_hex": devis.accent_hex,
+        "objet": devis.objet
+    }
+    if devis.client:
+        devis_dict["client"] = devis.client.dict()
+    content = {"session_id": devis.id, "assistant_message": "ok", "chips": ["Voir PDF", "Modifier"], "devis_id": devis.id, "devis": devis_dict}
+    # What FastAPI + JSONResponse do with a returned dict
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def after(devis, totaux) -> bytes:
+    return chat_response(devis.id, "ok", ["Voir PDF", "Modifier"], devis, totaux, client=devis.client).body
+
+
+def bench(fn, devis, totaux) -> float:
+    fn(devis, totaux) # warm-up
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        fn(devis, totaux)
+    return (time.perf_counter() - started) / RUNS * 1000
+
+
+if __name__ == "__main__":
+    devis = build_devis()
+    totaux = compute_totaux(devis)
+    old_body, new_body = before(devis, totaux), after(devis, totaux)
+    assert json.loads(old_body) == json.loads(new_body), "payloads differ"
+
+    print(f"Quote with {NB_LIGNES} lines, {RUNS} runs")
+    for name, fn, body in (("before", before, old_body), ("after", after, new_body)):
+        print(f"  {name:<6} {bench(fn, devis, totaux):7.2f} ms/payload | {len(body) / 1024:6.1f} KB | gzip {len(gzip.compress(body, 9)) / 1024:5.1f} KB")
@@ -0,0 +1,49 @@
+"""
+Peak memory of building + JSON-encoding a Resend payload with a large attachment.
+
+    python bench_email_attachment.py [size_mb]
+
+Each encoding runs in a fresh subprocess so the peak RSS (ru_maxrss) is not
+polluted by the previous run.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+
+SIZE_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode: str):
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app.services.email_service import encode_attachment
+
+    content = os.urandom(SIZE_MB * 1024 * 1024)
+    baseline = _peak_rss_mb()
+
+    if mode == "list":
+        # Previous implementation: list of ints
+        attachment = {"filename": "devis.pdf", "content": list(content)}
+    else:
+        attachment = encode_attachment("devis.pdf", content)
+    body = json.dumps({"to": ["client@example.com"], "attachments": [attachment]})
+
+    print(json.dumps({"mode": mode, "peak_mb": round(_peak_rss_mb() - baseline, 1), "json_mb": round(len(body) / 1024 / 1024, 1)}))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run(sys.argv[2])
+        sys.exit(0)
+
+    print(f"Attachment: {SIZE_MB} MB")
+    for mode in ("list", "base64"):
+        out = subprocess.run([sys.executable, __file__, str(SIZE_MB), mode], capture_output=True, text=True, check=True)
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"  {mode:<7} peak RSS +{res['peak_mb']:>7} MB | JSON body {res['json_mb']:>6} MB")
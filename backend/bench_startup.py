@@ -0,0 +1,101 @@
+"""
+Cold-start cost of the API process: `import app.main` and time to the first /health.
+
+    python bench_startup.py [runs]
+
+Each measure runs in a fresh subprocess (nothing cached in sys.modules).
+Exits with status 1 when the median exceeds the budget, so it can gate CI:
+    STARTUP_IMPORT_BUDGET_S (default 1.5) and STARTUP_HEALTH_BUDGET_S (default 3.0)
+"""
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+IMPORT_BUDGET_S = float(os.getenv("STARTUP_IMPORT_BUDGET_S", "1.5"))
+HEALTH_BUDGET_S = float(os.getenv("STARTUP_HEALTH_BUDGET_S", "3.0"))
+# Heavy dependencies that must stay out of the startup path (loaded on first use)
+LAZY_MODULES = ["openai", "pandas", "pypdf", "reportlab", "resend", "passlib", "PIL"]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Isolated SQLite DB (never touch devis.db), no background email worker
+ENV = {
+    **os.environ,
+    "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/bench_startup.db",
+    "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "test"),
+    "EMAIL_OUTBOX_WORKER": "0",
+}
+
+IMPORT_SNIPPET = """
+import json, sys, time
+t = time.perf_counter()
+import app.main
+print(json.dumps({"seconds": time.perf_counter() - t, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def measure_import() -> dict:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=HERE, env=ENV, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_health() -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=ENV, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited before answering /health")
+                if time.perf_counter() - started > 60:
+                    raise RuntimeError("/health not answered after 60s")
+                time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    measure_import() # Warm the .pyc files and the OS page cache
+
+    imports = [measure_import() for _ in range(RUNS)]
+    import_s = statistics.median(r["seconds"] for r in imports)
+    health_s = statistics.median(measure_first_health() for _ in range(RUNS))
+    loaded = sorted({m for r in imports for m in r["loaded"]})
+
+    print(f"Runs: {RUNS} (median)")
+    print(f"  import app.main     {import_s:6.3f} s  (budget {IMPORT_BUDGET_S} s)")
+    print(f"  first /health       {health_s:6.3f} s  (budget {HEALTH_BUDGET_S} s)")
+    print(f"  heavy modules at startup: {', '.join(loaded) or 'none'}")
+
+    failures = []
+    if import_s > IMPORT_BUDGET_S:
+        failures.append("import time over budget")
+    if health_s > HEALTH_BUDGET_S:
+        failures.append("time to first /health over budget")
+    if loaded:
+        failures.append(f"eagerly imported: {', '.join(loaded)}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
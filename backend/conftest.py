@@ -0,0 +1,32 @@
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+
+# One throwaway SQLite DB for the whole run (never devis.db): the engine is built once
+# per process, at the first import of the app, so this must run before any test module.
+# Dummy key for the OpenAI client (LLM calls are stubbed).
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/tests.db"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from app.db.database import create_db_and_tables, engine
+
+    async def create():
+        await create_db_and_tables()
+        # Pooled connections are bound to the event loop that opened them
+        await engine.dispose()
+
+    asyncio.run(create())
+
+
+@pytest.fixture
+def tenant(request) -> str:
+    """Entreprise name of its own for each test: the DB is shared by the whole run."""
+    return f"{request.node.name} {uuid.uuid4().hex[:8]}"
@@ -0,0 +1,72 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.db.database import engine
+from app.routers import upload
+from app.services.entreprise_cache import invalidate_entreprise
+
+def _parsed_file(file_path, file_ext):
+    # Stands in for the pandas/LLM parsing of the uploaded file (the router keeps the temp file)
+    os.remove(file_path)
+    # The parse can last minutes: no pooled connection held meanwhile
+    assert engine.sync_engine.pool.checkedout() == 0
+    return [{"label": "Plinthe grès", "price_ht": "12.5", "unit": "ml", "category": "Carrelage", "tva_rate": 20}]
+
+
+def _get(client, tenant, etag=None, **params):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get("/pricelist", params={"entreprise_nom": tenant, **params}, headers=headers)
+
+
+def test_every_write_changes_the_etag(tenant):
+    upload.parse_price_list_file, original = _parsed_file, upload.parse_price_list_file
+    try:
+        with TestClient(app) as client:
+            entreprise_id = client.post("/entreprise/register", json={"nom": tenant, "password": "secret"}).json()["id"]
+            etags = [_get(client, tenant).headers["etag"]]
+
+            def write_then_check(write):
+                res = write()
+                assert res.status_code == 200, res.text
+                listed = _get(client, tenant, etags[-1])
+                # New version: full body with a new ETag, which is then revalidated with a 304
+                assert listed.status_code == 200
+                assert listed.headers["etag"] not in etags
+                etags.append(listed.headers["etag"])
+                unchanged = _get(client, tenant, etags[-1])
+                assert unchanged.status_code == 304 and unchanged.content == b""
+                return res, listed.json()
+
+            item = {"label": "Carrelage 60x60", "price_ht": 40.0, "unit": "m2", "entreprise_id": entreprise_id}
+            created, items = write_then_check(lambda: client.post("/pricelist", json=item))
+            item_id = created.json()["id"]
+            assert [i["label"] for i in items] == ["Carrelage 60x60"]
+
+            _, items = write_then_check(lambda: client.patch(f"/pricelist/{item_id}", json={**item, "price_ht": 45.0}))
+            assert items[0]["price_ht"] == 45.0
+
+            def upload_price_list():
+                # Cache miss: the tenant is read from the DB just before the parse
+                invalidate_entreprise(tenant)
+                return client.post(
+                    "/upload/price-list",
+                    data={"entreprise_nom": tenant},
+                    files={"file": ("tarifs.csv", b"label;prix\n", "text/csv")},
+                )
+
+            _, items = write_then_check(upload_price_list)
+            assert sorted(i["label"] for i in items) == ["Carrelage 60x60", "Plinthe grès"]
+            uploaded_id = next(i["id"] for i in items if i["label"] == "Plinthe grès")
+
+            _, items = write_then_check(lambda: client.delete(f"/pricelist/{item_id}"))
+            assert [i["label"] for i in items] == ["Plinthe grès"]
+
+            _, items = write_then_check(lambda: client.post("/pricelist/bulk-delete", json=[uploaded_id]))
+            assert items == []
+
+            # Filters are part of the ETag
+            assert _get(client, tenant, q="Carrelage").headers["etag"] != etags[-1]
+    finally:
+        upload.parse_price_list_file = original
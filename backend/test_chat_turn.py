@@ -0,0 +1,133 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from openai.types import CompletionUsage
+
+from app.main import app
+from app.db.database import engine
+from app.models.llm import LLMQuoteResponse
+from app.services import chat_service, llm_service
+from app.services.admission import AdmissionRejected
+
+calls = []
+checked_out = []
+
+
+def _fake_call_model(model, messages):
+    # Stands in for the provider: records the prompt, answers with one line
+    calls.append(messages)
+    checked_out.append(engine.sync_engine.pool.checkedout())
+    response = LLMQuoteResponse(
+        reasoning="test",
+        action="update_quote",
+        assistant_message=f"Réponse {len(calls)}",
+        lines=[{"label": "Pose WC suspendu", "quantity": 1, "unit": "u", "unit_price_ht": 450.0, "tva_rate": 0.1}],
+    )
+    return response, CompletionUsage(prompt_tokens=100, completion_tokens=20, total_tokens=120), None
+
+
+def test_turns_carry_conversation_history(tenant):
+    llm_service._call_model, original = _fake_call_model, llm_service._call_model
+    try:
+        with TestClient(app) as client:
+            session_id = client.post("/chat/start", json={"entreprise_nom": tenant}).json()["session_id"]
+
+            first = client.post("/chat/turn", json={"session_id": session_id, "message": "Ajoute un WC suspendu"})
+            assert first.status_code == 200, first.text
+            assert first.json()["assistant_message"] == "Réponse 1"
+            assert [l["designation"] for l in first.json()["devis"]["lignes"]] == ["Pose WC suspendu"]
+
+            second = client.post("/chat/turn", json={"session_id": session_id, "message": "Et un lavabo"})
+            assert second.status_code == 200, second.text
+    finally:
+        llm_service._call_model = original
+
+    # The previous turn is sent verbatim between the prefix and the new turn
+    history = [(m["role"], m["content"]) for m in calls[1][2:-1]]
+    assert history == [("user", "Ajoute un WC suspendu"), ("assistant", "Réponse 1")]
+    assert calls[1][-1]["content"].endswith("Et un lavabo")
+    # No pooled connection held while waiting on the LLM
+    assert checked_out == [0, 0]
+
+
+def test_admission_wait_holds_no_connection(tenant):
+    # A turn queued by the admission control must not keep a pooled connection
+    at_admission = []
+
+    @asynccontextmanager
+    async def recording_admit(tenant, kind):
+        at_admission.append(engine.sync_engine.pool.checkedout())
+        yield
+
+    llm_service._call_model, original_call = _fake_call_model, llm_service._call_model
+    chat_service.admit, original_admit = recording_admit, chat_service.admit
+    try:
+        with TestClient(app) as client:
+            session_id = client.post("/chat/start", json={"entreprise_nom": tenant}).json()["session_id"]
+            res = client.post("/chat/turn", json={"session_id": session_id, "message": "Ajoute un WC suspendu"})
+            assert res.status_code == 200, res.text
+    finally:
+        llm_service._call_model = original_call
+        chat_service.admit = original_admit
+    assert at_admission == [0]
+
+
+def test_ws_turn_retried_after_429_runs(tenant):
+    # A turn refused by the admission control is not "handled": resending its turn_id runs it
+    refusals = [AdmissionRejected("Trop de requêtes pour cette entreprise, réessayez plus tard", 2)]
+
+    @asynccontextmanager
+    async def admit_once_refused(tenant, kind):
+        if refusals:
+            raise refusals.pop()
+        yield
+
+    llm_service._call_model, original_call = _fake_call_model, llm_service._call_model
+    chat_service.admit, original_admit = admit_once_refused, chat_service.admit
+    try:
+        with TestClient(app) as client:
+            session_id = client.post("/chat/start", json={"entreprise_nom": tenant}).json()["session_id"]
+            with client.websocket_connect(f"/ws/chat/{session_id}") as ws:
+                assert ws.receive_json()["type"] == "snapshot"
+                turn = {"type": "turn", "message": "Ajoute un WC suspendu", "turn_id": "t1"}
+
+                ws.send_json(turn)
+                refused = ws.receive_json()
+                assert (refused["type"], refused["status"], refused["turn_id"]) == ("error", 429, "t1")
+
+                # Each retry is followed by another turn: an ignored one can't leave the test waiting
+                ws.send_json(turn)
+                ws.send_json({"type": "turn", "message": "Et un lavabo", "turn_id": "t2"})
+                retried = ws.receive_json()
+                assert (retried["type"], retried["turn_id"], retried["version"]) == ("patch", "t1", 1)
+                assert ws.receive_json()["turn_id"] == "t2"
+
+                # Applied once: a third copy is ignored
+                ws.send_json(turn)
+                ws.send_json({"type": "turn", "message": "Et une douche", "turn_id": "t3"})
+                assert ws.receive_json()["turn_id"] == "t3"
+    finally:
+        llm_service._call_model = original_call
+        chat_service.admit = original_admit
+
+
+def test_only_invalid_output_escalates():
+    # A refusal is retried with the big model; a timeout goes straight to the fallback
+    for error, expected_models in (
+        (ValueError("refusal"), [llm_service.LLM_SMALL_MODEL, llm_service.LLM_MODEL]),
+        (TimeoutError("Request timed out."), [llm_service.LLM_SMALL_MODEL]),
+    ):
+        models = []
+
+        def failing_call_model(model, messages):
+            models.append(model)
+            return None, None, error
+
+        llm_service._call_model, original = failing_call_model, llm_service._call_model
+        try:
+            response, _ = llm_service.propose_quote_update("Ajoute un WC", SimpleNamespace(lignes=[]))
+        finally:
+            llm_service._call_model = original
+        assert models == expected_models
+        assert response.reasoning == "Error fallback"
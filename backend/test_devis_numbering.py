@@ -0,0 +1,39 @@
+import asyncio
+
+import httpx
+
+from app.main import app
+from app.db.database import async_session, engine
+from app.models.devis import Devis
+
+NB_QUOTES = 200
+
+
+async def _start_quotes(entreprise_nom: str, count: int) -> list:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*[
+            client.post("/chat/start", json={"entreprise_nom": entreprise_nom})
+            for _ in range(count)
+        ])
+    # Pooled connections are bound to this event loop
+    await engine.dispose()
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200][:3]
+    return [r.json()["devis"]["number"] for r in responses]
+
+
+def test_parallel_quotes_are_gap_free_and_unique(tenant):
+    numbers = asyncio.run(_start_quotes(tenant, NB_QUOTES))
+    assert sorted(numbers) == list(range(1, NB_QUOTES + 1))
+
+
+def test_counter_continues_after_existing_quotes(tenant):
+    async def seed():
+        async with async_session() as session:
+            session.add(Devis(entreprise_nom=tenant, number=41))
+            await session.commit()
+        await engine.dispose()
+
+    asyncio.run(seed())
+    numbers = asyncio.run(_start_quotes(tenant, 20))
+    assert sorted(numbers) == list(range(42, 62))
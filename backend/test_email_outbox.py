@@ -0,0 +1,117 @@
+import asyncio
+
+import httpx
+from sqlalchemy import update
+
+from app.main import app
+from app.db.database import async_session, engine
+from app.models.email import EmailOutbox, utcnow
+from app.services import email_outbox, email_service
+from app.services.email_service import EmailService, FakeProvider
+
+
+async def _queue(subject: str) -> str:
+    async with async_session() as session:
+        attachment = EmailService.queue_attachment(session, "Devis-1.pdf", b"%PDF-1.4 test", "application/pdf")
+        email = EmailService.queue_email(session, "client@example.com", subject, "<p>Devis</p>", attachment_id=attachment.id)
+        await session.commit()
+    return email.id
+
+
+async def _load(email_id: str) -> EmailOutbox:
+    async with async_session() as session:
+        return await session.get(EmailOutbox, email_id)
+
+
+async def _make_due(email_id: str):
+    # Skips the backoff delay instead of sleeping through it
+    async with async_session() as session:
+        await session.execute(update(EmailOutbox).where(EmailOutbox.id == email_id).values(next_attempt_at=utcnow()))
+        await session.commit()
+
+
+async def _status_over_http(email_id: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(f"/emails/{email_id}")
+
+
+def test_retry_with_backoff_then_sent():
+    provider = email_service._provider = FakeProvider()
+    provider.fail_next = 2
+
+    async def scenario():
+        email_id = await _queue("Devis retry")
+
+        assert await email_outbox.drain_outbox() == 1
+        email = await _load(email_id)
+        assert (email.status, email.attempts, email.last_error) == ("pending", 1, "Fake provider failure")
+        # Not due before its backoff (base delay +/-20% jitter)
+        delay = (email.next_attempt_at.replace(tzinfo=None) - utcnow().replace(tzinfo=None)).total_seconds()
+        assert 0.7 * email_outbox.EMAIL_RETRY_BASE_SECONDS < delay <= 1.2 * email_outbox.EMAIL_RETRY_BASE_SECONDS
+        assert await email_outbox.drain_outbox() == 0
+
+        await _make_due(email_id)
+        await email_outbox.drain_outbox()
+        assert (await _load(email_id)).attempts == 2
+
+        await _make_due(email_id)
+        await email_outbox.drain_outbox()
+        email = await _load(email_id)
+        assert (email.status, email.attempts, email.provider_id, email.last_error) == ("sent", 3, "fake-1", None)
+        assert provider.sent[0]["attachments"][0]["filename"] == "Devis-1.pdf"
+
+        res = await _status_over_http(email_id)
+        assert res.status_code == 200
+        assert res.json()["status"] == "sent" and res.json()["attempts"] == 3
+        assert (await _status_over_http("inconnu")).status_code == 404
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_dead_letter_after_max_attempts():
+    provider = email_service._provider = FakeProvider()
+    provider.fail_next = email_outbox.EMAIL_MAX_ATTEMPTS + 1
+
+    async def scenario():
+        email_id = await _queue("Devis dead letter")
+        for _ in range(email_outbox.EMAIL_MAX_ATTEMPTS):
+            await _make_due(email_id)
+            await email_outbox.drain_outbox()
+        email = await _load(email_id)
+        assert (email.status, email.attempts) == ("dead", email_outbox.EMAIL_MAX_ATTEMPTS)
+
+        # Never retried, even once due
+        await _make_due(email_id)
+        assert await email_outbox.drain_outbox() == 0
+        assert provider.sent == []
+
+        res = await _status_over_http(email_id)
+        assert res.json()["status"] == "dead" and res.json()["last_error"] == "Fake provider failure"
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_send_wait_sees_attempts_made_elsewhere():
+    # Attempt made by another process' worker: the local future never resolves, the row poll sees it
+    email_service._provider = FakeProvider()
+
+    async def other_process(email_id: str):
+        await asyncio.sleep(0.3)
+        email_outbox._waiters.pop(email_id)
+        await email_outbox.drain_outbox()
+
+    async def scenario():
+        email_id = await _queue("Devis autre worker")
+        futures = email_outbox.watch_delivery([email_id])
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(email_outbox.wait_for_delivery([email_id], futures, timeout=10), other_process(email_id))
+        assert loop.time() - started < 2
+        assert not futures[0].done() and email_id not in email_outbox._waiters
+        assert (await _load(email_id)).status == "sent"
+        await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.services.idempotency import IdempotencyMiddleware
+
+runs = []
+
+# Minimal app on an idempotent route: counts its runs, slow enough to overlap duplicates
+app = FastAPI()
+app.add_middleware(IdempotencyMiddleware)
+
+
+@app.post("/chat/turn")
+async def turn(request: Request):
+    body = await request.json()
+    runs.append(body)
+    await asyncio.sleep(0.2)
+    if body.get("fail"):
+        return JSONResponse({"detail": "Erreur"}, status_code=503)
+    return {"run": len(runs), "message": body["message"]}
+
+
+async def _post(client, key: str, body: dict) -> httpx.Response:
+    return await client.post("/chat/turn", json=body, headers={"Idempotency-Key": key})
+
+
+def _run(scenario):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client)
+    runs.clear()
+    return asyncio.run(main())
+
+
+def test_concurrent_duplicate_waits_and_replays():
+    async def scenario(client):
+        return await asyncio.gather(*[_post(client, "key-dup", {"message": "Ajoute un WC"}) for _ in range(3)])
+
+    responses = _run(scenario)
+    assert len(runs) == 1
+    assert all(r.status_code == 200 and r.json() == {"run": 1, "message": "Ajoute un WC"} for r in responses)
+    assert sorted(r.headers.get("idempotent-replayed") for r in responses if r.headers.get("idempotent-replayed")) == ["true", "true"]
+
+
+def test_reused_key_with_another_body_is_refused():
+    async def scenario(client):
+        first = await _post(client, "key-reuse", {"message": "Ajoute un WC"})
+        second = await _post(client, "key-reuse", {"message": "Ajoute un lavabo"})
+        return first, second
+
+    first, second = _run(scenario)
+    assert first.status_code == 200
+    assert second.status_code == 409
+    assert len(runs) == 1
+
+
+def test_retry_after_error_runs_again():
+    async def scenario(client):
+        failed = await _post(client, "key-error", {"message": "Ajoute un WC", "fail": True})
+        retried = await _post(client, "key-error", {"message": "Ajoute un WC", "fail": True})
+        return failed, retried
+
+    failed, retried = _run(scenario)
+    assert failed.status_code == retried.status_code == 503
+    assert "idempotent-replayed" not in retried.headers
+    assert len(runs) == 2
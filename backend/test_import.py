@@ -1,2 +1,2 @@
-from app.models.devis import Devis
-print("Import successful")
+from app.models.devis import Devis
+print("Import successful")
@@ -0,0 +1,47 @@
+import random
+
+from app.models.devis import Ligne
+from app.services.llm_context import build_quote_context
+from app.services.llm_service import build_messages
+
+# Large enough to overflow the catalog block of the prefix
+CATALOG = [
+    {"label": f"Article {i:04d} {category}", "unit": "u", "price_ht": 10.0 + i, "tva": 20.0, "category": category}
+    for i, category in enumerate(["Plomberie", "Électricité", "Carrelage", "Peinture"] * 500)
+]
+CATALOG.append({"label": "Pose fenêtre PVC", "unit": "u", "price_ht": 300.0, "tva": 10.0, "category": "Menuiserie"})
+
+
+def _lignes(n: int):
+    return [Ligne(designation=f"Ligne {i}", qte=1, pu_ht=50.0, devis_id="d1") for i in range(n)]
+
+
+def test_prefix_is_identical_across_turns():
+    first = build_messages("Ajoute un WC suspendu", _lignes(2), CATALOG)
+    second = build_messages("Pose de 3 fenêtres dans le salon", _lignes(5), CATALOG, include_detailed_description=True)
+    assert first[:-1] == second[:-1]
+    assert first[-1] != second[-1]
+
+
+def test_prefix_ignores_catalog_order():
+    shuffled = CATALOG[:]
+    random.Random(42).shuffle(shuffled)
+    assert build_messages("Bonjour", [], CATALOG)[:-1] == build_messages("Bonjour", [], shuffled)[:-1]
+
+
+def test_volatile_content_is_last():
+    messages = build_messages("Pose de 3 fenêtres", _lignes(1), CATALOG)
+    assert messages[-1]["role"] == "user"
+    assert messages[-1]["content"].endswith("Pose de 3 fenêtres")
+    # Relevant item left out of the prefix: sent with the turn
+    assert "Pose fenêtre PVC" not in messages[1]["content"]
+    assert "Pose fenêtre PVC" in messages[-1]["content"]
+
+
+def test_numbers_are_exact():
+    lignes = [Ligne(designation="Charpente", qte=12.5, pu_ht=10250.55, devis_id="d1"), Ligne(designation="Gros oeuvre", qte=1, pu_ht=1234567.5, devis_id="d1")]
+    catalog = [{"label": "Extension bois", "unit": "u", "price_ht": 12345.67, "tva": 20.0, "category": "Charpente"}]
+    catalog_block, turn_block, _ = build_quote_context("Ajoute l'extension", lignes, catalog)
+    assert "12345.67" in catalog_block
+    assert "10250.55" in turn_block and "1234567.5" in turn_block and "12.5" in turn_block
+    assert "e+" not in catalog_block + turn_block
@@ -0,0 +1,60 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.db.database import async_session, engine
+from app.db.query_counter import assert_max_queries
+from app.db.repository import get_devis_with_entreprise
+from app.models.client import Client
+from app.models.devis import Devis, Ligne
+from app.models.entreprise import Entreprise
+from app.services.calc_service import compute_totaux
+
+
+async def _seed(entreprise_nom: str, nb_lignes: int = 20) -> str:
+    async with async_session() as session:
+        session.add(Entreprise(nom=entreprise_nom))
+        client = Client(nom="M. Dupont", entreprise_nom=entreprise_nom)
+        session.add(client)
+        devis = Devis(entreprise_nom=entreprise_nom, client_id=client.id, number=1)
+        session.add(devis)
+        session.add_all([
+            Ligne(designation=f"Ligne {i}", qte=2, pu_ht=10.0, devis_id=devis.id)
+            for i in range(nb_lignes)
+        ])
+        await session.commit()
+    # Pooled connections are bound to the current event loop
+    await engine.dispose()
+    return devis.id
+
+
+async def _load_and_check(devis_id: str, entreprise_nom: str):
+    async with async_session() as session:
+        # Cold tenant cache: devis + client, lignes, entreprise
+        with assert_max_queries(3):
+            await get_devis_with_entreprise(session, devis_id)
+    async with async_session() as session:
+        # Warm tenant cache: the entreprise costs no query
+        with assert_max_queries(2):
+            devis, entreprise = await get_devis_with_entreprise(session, devis_id)
+            # Touching relationships must not trigger lazy loads
+            assert devis.client.nom == "M. Dupont"
+            assert entreprise.nom == entreprise_nom
+            assert compute_totaux(devis)["ht"] == 400.0
+    await engine.dispose()
+
+
+def test_devis_full_load_budget(tenant):
+    devis_id = asyncio.run(_seed(tenant))
+    asyncio.run(_load_and_check(devis_id, tenant))
+
+
+def test_pdf_endpoint_budget(tenant):
+    devis_id = asyncio.run(_seed(tenant))
+    with TestClient(app) as client:
+        client.get(f"/devis/{devis_id}/pdf")  # warm the tenant cache
+        with assert_max_queries(2):
+            res = client.get(f"/devis/{devis_id}/pdf")
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/pdf"
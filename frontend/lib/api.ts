@@ -31,6 +31,21 @@ async function request<T>(endpoint: string, options: RequestInit = {}): Promise<
     }
 }
 
+// POSTs with side effects (LLM call, email): retried on network errors with the same
+// Idempotency-Key, the API answers a retry with the original response instead of redoing the work
+async function idempotentRequest<T>(endpoint: string, options: RequestInit, retries: number = 2): Promise<T> {
+    const headers = { ...options.headers, 'Idempotency-Key': crypto.randomUUID() };
+    for (let attempt = 0; ; attempt++) {
+        try {
+            return await request<T>(endpoint, { ...options, headers });
+        } catch (error) {
+            // fetch rejects with a TypeError when no response was received
+            if (!(error instanceof TypeError) || attempt >= retries) throw error;
+            await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+        }
+    }
+}
+
 export const api = {
     getBaseUrl: () => API_BASE,
     health: () => request('/health'),
@@ -42,14 +57,14 @@ export const api = {
             body: JSON.stringify({ client_id: clientId, client, theme, entreprise_nom: entrepriseNom })
         }),
 
-    chatTurn: (sessionId: string, message: string, includeDetailedDescription: boolean = false, priceList: any[] = [], imageBase64?: string) =>
-        request<ChatResponse>('/chat/turn', {
+    // The server uses its own catalog snapshot of the enterprise: no price list to send
+    chatTurn: (sessionId: string, message: string, includeDetailedDescription: boolean = false, imageBase64?: string) =>
+        idempotentRequest<ChatResponse>('/chat/turn', {
             method: 'POST',
             body: JSON.stringify({
                 session_id: sessionId,
                 message,
                 includeDetailedDescription,
-                price_list: priceList,
                 image_base64: imageBase64
             })
         }),
@@ -69,8 +84,8 @@ export const api = {
             body: JSON.stringify(data)
         }),
 
-    sendDevisEmail: (devisId: string, data: { to_email: string; subject: string; message: string }) =>
-        request<{ ok: boolean }>(`/devis/${devisId}/send`, {
+    sendDevisEmail: (devisId: string, data: { to_email?: string; to?: string[]; cc?: string[]; bcc?: string[]; subject: string; message: string }) =>
+        idempotentRequest<{ ok: boolean; detail: string; recipients: { email: string; type: string; email_id: string; status: string; error: string | null }[] }>(`/devis/${devisId}/send`, {
             method: 'POST',
             body: JSON.stringify(data)
         }),
@@ -48,17 +48,8 @@ export function useChatSession() {
         setIsLoading(true);
 
         try {
-            // Fetch real catalog from DB if enterprise is known
-            let priceList: any[] = [];
-            if (currentEntNom) {
-                try {
-                    priceList = await api.listCatalog(currentEntNom);
-                } catch (e) {
-                    console.warn("Failed to fetch catalog for chat context", e);
-                }
-            }
-
-            const res = await api.chatTurn(sessionId, content, includeDetailedDescription, priceList, imageBase64);
+            // The server resolves the enterprise catalog itself
+            const res = await api.chatTurn(sessionId, content, includeDetailedDescription, imageBase64);
             setDevis(res.devis);
             addMessage('assistant', res.assistant_message);
         } catch (error) {
@@ -67,7 +58,7 @@ export function useChatSession() {
         } finally {
             setIsLoading(false);
         }
-    }, [sessionId, currentEntNom]);
+    }, [sessionId]);
 
     return {
         sessionId,